@@ -0,0 +1,52 @@
+# bench_fused_eval.py
+# 对比 xConvFormulaTransformer 的 eval 后端与融合分块后端（xConvFusedEval），并校验两者结果一致
+# 用法（在仓库根目录）: python brief_function_test/bench_fused_eval.py
+import sys
+import time
+import numpy as np
+sys.path.append('./')
+from xConv.xConv import xConvFormulaTransformer
+from xConv import xConvFusedEval
+
+N_POINTS = 1_000_000
+EXPRESSIONS = ['capZ21_config3', 'indZ21_config2', '20*log10(abs(z11))', 'phase(z11)*180/pi']
+
+
+def make_dataset(n):
+    rng = np.random.default_rng(0)
+    s = rng.standard_normal((n, 2, 2)) + 1j * rng.standard_normal((n, 2, 2))
+    data = {'freq': np.logspace(3, 9.7, n), 's': s}
+    for name, i, j in (('s11', 0, 0), ('s12', 0, 1), ('s21', 1, 0), ('s22', 1, 1)):
+        data[name] = s[:, i, j]
+    return data
+
+
+def timeit(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    data = make_dataset(N_POINTS)
+    formulas = xConvFormulaTransformer.read_formula_file("xConv/xConvFormulaDef.json") or {}
+    plain = xConvFormulaTransformer('eval')
+    fused = xConvFormulaTransformer('fused')
+    plain.define(formulas)
+    fused.define(formulas)
+
+    print(f'{N_POINTS} points, best of 3, numexpr {"on" if xConvFusedEval.numexpr else "off"}')
+    for expr in EXPRESSIONS:
+        ok, err = fused.check_backend(data, expr)
+        # eval 后端每次换一个数据集对象，避免命中已求值的中间变量
+        t_eval = timeit(lambda: plain.apply_formula(dict(data), expr))
+        t_fused = timeit(lambda: fused.apply_formula(data, expr))
+        print(f'  {expr:22s} eval {t_eval * 1e3:7.1f} ms   fused {t_fused * 1e3:7.1f} ms'
+              f'   x{t_eval / t_fused:4.2f}   {"OK" if ok else "MISMATCH"} (max err {err:.1e})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# bench_snp_writer.py
+# 对比驱动/转换器原有的逐值写入与 xConvSNPWriter 批量写入（65535 点 s2p）
+# 用法（在仓库根目录）: python brief_function_test/bench_snp_writer.py
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+sys.path.append('./')
+from xConv.xConvSNPWriter import write_snp, s2p_from_pairs
+
+N_POINTS = 65535
+
+
+# ---------- 原 LibreVNA.py / SVA1000X.py 中的 write_s2p ----------
+def legacy_driver_write_s2p(filename, freqs, s_data):
+    with open(filename, 'w') as f:
+        f.write("! Touchstone file generated by LibreVNA.py\n")
+        f.write("# Hz S RI R 50\n")
+        f.write("! Freq ReS11 ImS11 ReS21 ImS21 ReS12 ImS12 ReS22 ImS22\n")
+        n = len(freqs)
+        for i in range(n):
+            idx = i * 2
+            line = f"{freqs[i]:.6e} "
+            line += f"{s_data['s11'][idx]:.6f} {s_data['s11'][idx+1]:.6f} "
+            line += f"{s_data['s21'][idx]:.6f} {s_data['s21'][idx+1]:.6f} "
+            line += f"{s_data['s12'][idx]:.6f} {s_data['s12'][idx+1]:.6f} "
+            line += f"{s_data['s22'][idx]:.6f} {s_data['s22'][idx+1]:.6f}\n"
+            f.write(line)
+
+
+# ---------- 原 xConvSNPConverter._write_v1 ----------
+def legacy_write_v1(fname, freq_hz, data):
+    n_ports = data.shape[2]
+    with open(fname, 'w', encoding='utf-8') as f:
+        f.write('# HZ S RI R 50\n')
+        for i, fr in enumerate(freq_hz):
+            f.write(f'{fr:.10e} ')
+            for r in range(n_ports):
+                for c in range(n_ports):
+                    z = data[i, r, c]
+                    f.write(f'{z.real:.10e} {z.imag:.10e} ')
+            f.write('\n')
+
+
+def timeit(func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    freqs = np.logspace(5, 9.7, N_POINTS)
+    s_data = {k: (rng.standard_normal(2 * N_POINTS) * 0.5).tolist() for k in ('s11', 's21', 's12', 's22')}
+    data = s2p_from_pairs(s_data)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, 'bench.s2p')
+        results = [
+            ('driver write_s2p (.6f, per line)', timeit(legacy_driver_write_s2p, out, freqs.tolist(), s_data)),
+            ('xConvSNPConverter._write_v1 (per value)', timeit(legacy_write_v1, out, freqs, data)),
+        ]
+        for fmt in ('RI', 'MA', 'DB'):
+            results.append((f'xConvSNPWriter.write_snp {fmt}',
+                            timeit(lambda: write_snp(out, freqs, data, fmt=fmt))))
+        print(f'{N_POINTS} points, 2-port, best of 3')
+        base = results[1][1]
+        for name, t in results:
+            print(f'  {name:42s} {t * 1e3:8.1f} ms   x{base / t:5.2f}')
+
+
+if __name__ == '__main__':
+    main()
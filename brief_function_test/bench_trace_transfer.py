@@ -0,0 +1,99 @@
+# bench_trace_transfer.py
+# 对比 VNA 驱动迹线数据的几种解码方式：逐值 ASCII 解析（旧）、向量化 ASCII 解析、REAL,64 二进制块 + np.frombuffer
+# 离线部分用合成数据比较解码耗时、传输字节数以及 ASCII（6 位有效数字）的精度损失；
+# 给出 --sva 地址时再用 SVA1000X 实测两种传输格式的读取耗时
+# 用法（在仓库根目录）: python brief_function_test/bench_trace_transfer.py [--points 10001] [--sva TCPIP::192.168.1.119::INSTR]
+import argparse
+import importlib.util
+import sys
+import time
+import numpy as np
+sys.path.append('./')
+
+
+def load_driver(model):
+    spec = importlib.util.spec_from_file_location(model, f"xDriver/VNA_Class/{model}.py")
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    return mod
+
+
+def timeit(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def make_trace(n):
+    rng = np.random.default_rng(0)
+    freq = np.logspace(5, 9.7, n)
+    s = (rng.standard_normal(n) + 1j * rng.standard_normal(n)) * 0.3
+    return freq, s
+
+
+def offline(n):
+    freq, s = make_trace(n)
+    pairs = np.empty(2 * n)
+    pairs[0::2] = s.real
+    pairs[1::2] = s.imag
+
+    # SVA1000X: FDATa? 返回 Re,Im,Re,Im,...
+    ascii_text = ','.join(f'{v:.6g}' for v in pairs)
+    payload = pairs.astype('<f8').tobytes()
+    block = b'#%d%d' % (len(str(len(payload))), len(payload)) + payload + b'\n'
+    hdr = 2 + int(block[1:2])
+    t_old = timeit(lambda: [float(x) for x in ascii_text.split(',')])
+    t_vec = timeit(lambda: np.fromstring(ascii_text, dtype=np.float64, sep=','))
+    t_bin = timeit(lambda: np.frombuffer(block, dtype='<f8', count=len(payload) // 8, offset=hdr))
+    err = np.max(np.abs(np.fromstring(ascii_text, dtype=np.float64, sep=',') - pairs) / np.abs(pairs))
+    print(f'SVA1000X, {n} points per trace (best of 5)')
+    print(f'  ASCII per-value parse   {t_old * 1e3:8.2f} ms   {len(ascii_text):9d} bytes')
+    print(f'  ASCII vectorized        {t_vec * 1e3:8.2f} ms   {len(ascii_text):9d} bytes   x{t_old / t_vec:.1f}')
+    print(f'  REAL,64 np.frombuffer   {t_bin * 1e3:8.4f} ms   {len(block):9d} bytes   x{t_old / t_bin:.0f}')
+    print(f'  ASCII (6 significant digits) max relative error {err:.1e}, REAL,64 is exact')
+
+    # LibreVNA: VNA:TRAC:DATA? 返回 [freq,re,im],[freq,re,im],...
+    lv = load_driver('LibreVNA')
+    raw = ','.join(f'[{f:.0f},{v.real:.6g},{v.imag:.6g}]' for f, v in zip(freq, s))
+
+    def per_line(raw):
+        pairs = [ln.split(',') for ln in raw.strip('[]').split('],[')]
+        return [complex(float(p[1]), float(p[2])) for p in pairs]
+
+    t_old = timeit(per_line, raw)
+    t_vec = timeit(lv.parse_trace, raw)
+    print(f'LibreVNA, {n} points per trace (no binary trace format over SCPI)')
+    print(f'  per-line parse          {t_old * 1e3:8.2f} ms')
+    print(f'  vectorized parse_trace  {t_vec * 1e3:8.2f} ms   x{t_old / t_vec:.1f}')
+
+
+def live_sva(address, n):
+    drv = load_driver('SVA1000X')
+    for fmt in ('ASCII', 'REAL64'):
+        args = drv.parse_arguments(['--device-address', address, '--start-freq', '1e6', '--stop-freq', '1e9',
+                                    '--sweep-points', str(n), '--output-file', 'bench.s2p',
+                                    '--data-format', fmt])
+        session = drv.open_session(args)
+        try:
+            drv.perform_measurement(session.inst)
+            t = timeit(drv.retrieve_data, session.inst, session.dtype, repeat=3)
+        finally:
+            drv.close_session(session)
+        print(f'  SVA1000X {fmt:6s} retrieve_data (4 traces)  {t * 1e3:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--points', type=int, default=10001)
+    parser.add_argument('--sva', help='VISA address of an SVA1000X for a live comparison')
+    args = parser.parse_args()
+    offline(args.points)
+    if args.sva:
+        live_sva(args.sva, args.points)
+
+
+if __name__ == '__main__':
+    main()
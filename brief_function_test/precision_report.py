@@ -0,0 +1,62 @@
+# precision_report.py
+# 对比 xConvFormulaTransformer 的 display（complex64/float32）与 export（complex128/float64）精度策略
+# 在 data/ 下全部样例文件上计算常用曲线表达式和公式变量，报告最大误差与中间变量占用的内存
+# 用法（在仓库根目录）: python brief_function_test/precision_report.py [文件或通配符 ...]
+import glob
+import sys
+import numpy as np
+sys.path.append('./')
+from xConv.xConv import xConvS2PReader, xConvFormulaTransformer
+
+# trace_config.py 中各显示格式包裹后的表达式
+BASE = ['z11', 's11', 's21', '1/z11']
+FORMATS = ['abs({})', '20*log10(abs({}))', 'phase({})*180/pi', 'real({})', 'imag({})']
+
+
+def compare(data, formulas, expressions):
+    """返回 [(表达式, 最大绝对误差, 相对误差)] 以及两种模式下中间变量的总字节数"""
+    modes = {}
+    for precision in ('export', 'display'):
+        t = xConvFormulaTransformer(use_result_cache=False, precision=precision)
+        t.define(formulas)
+        modes[precision] = (t, [np.asarray(t.apply_formula(data, e)) for e in expressions])
+    rows = []
+    for expr, ref, low in zip(expressions, modes['export'][1], modes['display'][1]):
+        ok = np.isfinite(ref) & np.isfinite(low)
+        err = np.abs(low[ok].astype(ref.dtype) - ref[ok])
+        scale = np.max(np.abs(ref[ok]), initial=0.0)
+        max_err = float(np.max(err, initial=0.0))
+        rows.append((expr, max_err, max_err / scale if scale else 0.0))
+    mem = {p: sum(v.nbytes for v in t.variables.values()) for p, (t, _) in modes.items()}
+    return rows, mem
+
+
+def main():
+    patterns = sys.argv[1:] or ['data/*.s2p']
+    files = sorted({p for pat in patterns for p in glob.glob(pat)})
+    formulas = xConvFormulaTransformer.read_formula_file("xConv/xConvFormulaDef.json") or {}
+    expressions = [fmt.format(b) for b in BASE for fmt in FORMATS] + list(formulas)
+
+    worst = {}
+    mem_total = {'export': 0, 'display': 0}
+    for path in files:
+        data = xConvS2PReader(path, use_cache=False).read()
+        rows, mem = compare(data, formulas, expressions)
+        for expr, abs_err, rel_err in rows:
+            w = worst.get(expr, (0.0, 0.0, ''))
+            if rel_err >= w[1]:
+                worst[expr] = (abs_err, rel_err, path)
+        for k in mem_total:
+            mem_total[k] += mem[k]
+
+    print(f'{len(files)} files, display (complex64/float32) vs export (complex128/float64)')
+    print(f'  {"expression":28s} {"max abs err":>12s} {"rel to max":>11s}  worst file')
+    for expr in expressions:
+        abs_err, rel_err, path = worst[expr]
+        print(f'  {expr:28s} {abs_err:12.3e} {rel_err:11.2e}  {path}')
+    print(f'intermediate variables: export {mem_total["export"] / 1024:.1f} KB, '
+          f'display {mem_total["display"] / 1024:.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# test_evaluate_batch.py
+# evaluate_batch（公共子表达式消除）与逐个 apply_formula 的结果对照
+# 用法（在仓库根目录）: python -m pytest brief_function_test/test_evaluate_batch.py
+import sys
+import numpy as np
+sys.path.append('./')
+from xConv.xConv import xConvFormulaTransformer, sparam_dataset, compile_formula
+
+
+def make_dataset(n=11):
+    rng = np.random.default_rng(0)
+    s = rng.standard_normal((n, 2, 2)) + 1j * rng.standard_normal((n, 2, 2))
+    return sparam_dataset(np.linspace(1e6, 1e9, n), s)
+
+
+def check_against_apply(formulas):
+    d = make_dataset()
+    t = xConvFormulaTransformer(use_result_cache=False)
+    results, stats = t.evaluate_batch(d, formulas)
+    for formula, y in zip(formulas, results):
+        assert np.allclose(y, t.apply_formula(d, formula), equal_nan=True), formula
+    return stats
+
+
+def test_s_array_subscript():
+    # 切片下标 s[:, i, j] 保持原样，只对被下标的值做 CSE
+    check_against_apply(['s[:, 1, 0]', 'abs(s[:, 1, 0])', 's[1:3, 0, 0]', '20*log10(abs(s[:, 0, 0]))'])
+
+
+def test_short_circuit_kept():
+    # IfExp / BoolOp 整体计算，不会提前求值未选中的分支
+    check_against_apply(['s21 if 1 else 1/0', '0 and 1/0'])
+
+
+def test_cse_shares_subexpressions():
+    stats = check_against_apply(['abs(s11)', '20*log10(abs(s11))'])
+    assert stats['saved'] == 1
+
+
+def test_temporaries_not_in_formula_cache():
+    compile_formula.cache_clear()
+    formulas = ['abs(s11)+abs(s21)', 'abs(s11)*2']
+    check_against_apply(formulas)
+    assert compile_formula.cache_info().currsize <= len(formulas)
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(name, 'ok')
@@ -13,6 +13,7 @@ class waveWidget(QtWidgets.QWidget):
     光标自动联动，滚轮/拖动已禁用
     """
     cursorMoved = QtCore.Signal(float, dict)   # freq, {trace_name: y_value}
+    MAX_SEGMENTS = 64   # 流式测量时每条迹线分成的块数
 
     def __init__(self, parent=None, freq_axis='log'):
         super().__init__(parent)
@@ -23,6 +24,7 @@ class waveWidget(QtWidgets.QWidget):
         self.traces = {} # name -> trace_info dict
         self.trace_cursor_hLines = {} # name -> trace_cursor_hLines
         self.data = {}   # name -> data array
+        self.segments = {}  # name -> {块号: PlotDataItem}，流式测量时分块绘制的曲线
         self.unit = {}   # name -> unit string
         self.label = {}  # name -> label string
 
@@ -154,9 +156,7 @@ class waveWidget(QtWidgets.QWidget):
         self.unit[name] = unit
         self.label[name] = label
         # 获取所有数据中数据最大值和最小值，并更新viewBox的y范围限制
-        self.y_min = self.y_min if np.min(self.data[name]) > self.y_min else np.min(self.data[name])
-        self.y_max = np.max(self.data[name]) if np.max(self.data[name]) > self.y_max else self.y_max
-        self.pw.getViewBox().setLimits(yMin=self.y_min - abs(0.1 * (self.y_max-self.y_min)), yMax=self.y_max + abs(0.1 * (self.y_max-self.y_min)))
+        self._update_y_limits(self.data[name])
         
         if unit == "":
             self.set_axis_labels('Frequency (Hz)', name)
@@ -170,9 +170,58 @@ class waveWidget(QtWidgets.QWidget):
         self.auto_range()
         self.cursor_label_position_update()
     
+    # ---------------- 更新y范围限制（忽略nan/inf） ----------------
+    def _update_y_limits(self, values):
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return
+        self.y_min = min(self.y_min, float(np.min(finite)))
+        self.y_max = max(self.y_max, float(np.max(finite)))
+        self.pw.getViewBox().setLimits(yMin=self.y_min - abs(0.1 * (self.y_max-self.y_min)), yMax=self.y_max + abs(0.1 * (self.y_max-self.y_min)))
+
+    # ---------------- 流式测量：写入一段新数据 ----------------
+    def set_trace_block(self, name, start, y_block):
+        """
+        把 y_block 写入迹线 name 的 [start, start+len) 段，只更新这一段数据和y范围限制
+        迹线需先用完整频率网格和 nan 占位数据 add_trace，尚未测到的点不绘制
+        """
+        if name not in self.traces:
+            return
+        y_block = np.asarray(y_block, dtype=float)
+        stop = start + len(y_block)
+        if stop <= start:
+            return
+        if not self.data[name].flags.writeable:
+            self.data[name] = self.data[name].copy()
+        self.data[name][start:stop] = y_block
+        self._update_y_limits(y_block)
+        # 只上传和绘制这一段所在的块
+        self._draw_segment(name, start, stop)
+
+    def _draw_segment(self, name, lo, hi):
+        """
+        流式测量时迹线按固定长度分块，每块一个 PlotDataItem（与前一块共用端点），
+        只重绘与 [lo, hi) 相交的块，每段新数据上传的点数约为段长加两块，与整条迹线长度无关
+        """
+        n = len(self.freq)
+        tile = -(-n // self.MAX_SEGMENTS)
+        segs = self.segments.setdefault(name, {})
+        pen = self.traces[name].opts['pen']
+        for k in range(lo // tile, (hi - 1) // tile + 1):
+            a, b = max(k * tile - 1, 0), min((k + 1) * tile, n)
+            if k in segs:
+                segs[k].setData(self.freq[a:b], self.data[name][a:b], connect='finite')
+            else:
+                segs[k] = self.pw.plot(self.freq[a:b], self.data[name][a:b], pen=pen, connect='finite')
+
+    def _remove_segments(self, name):
+        for item in self.segments.pop(name, {}).values():
+            self.pw.removeItem(item)
+
     # --------------- 删除指定trace ---------------
     def remove_trace(self, name: str=None):
         if name in self.traces:
+            self._remove_segments(name)
             self.pw.removeItem(self.traces[name])
             self.pw.removeItem(self.trace_cursor_hLines[name])
             del self.traces[name]
@@ -184,6 +233,8 @@ class waveWidget(QtWidgets.QWidget):
         else:
             for trace in self.traces.values():
                 self.pw.removeItem(trace)
+            for seg_name in list(self.segments):
+                self._remove_segments(seg_name)
             for hLine in self.trace_cursor_hLines.values():
                 self.pw.removeItem(hLine)
             self.traces.clear()
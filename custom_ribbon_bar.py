@@ -38,9 +38,9 @@ class customRibbonBar(RibbonBar):
         self.save_as_button = file_panel.addSmallButton("Save As",QIcon("./icon/bootstrap/save-fill.svg"),alignment=Qt.AlignmentFlag.AlignLeft)
         self.report_button = file_panel.addSmallButton("Report",QIcon("./icon/bootstrap/archive.svg"),alignment=Qt.AlignmentFlag.AlignLeft)
         measurment_panel = self.category_home.addPanel("Measurement",showPanelOptionButton=False)
-        measurment_panel.addLargeButton("Continuous",QIcon("./icon/bootstrap/skip-forward.svg"))
+        self.cont_meas_button=measurment_panel.addLargeButton("Continuous",QIcon("./icon/bootstrap/skip-forward.svg"))
         self.single_meas_button=measurment_panel.addLargeButton("Single",QIcon("./icon/bootstrap/skip-end.svg"))
-        measurment_panel.addLargeButton("Stop",QIcon("./icon/bootstrap/pause.svg"))
+        self.stop_meas_button=measurment_panel.addLargeButton("Stop",QIcon("./icon/bootstrap/pause.svg"))
 
         plot_panel = self.category_home.addPanel("Plot",showPanelOptionButton=False)
         self.plot_large_button = plot_panel.addLargeButton("Plot",QIcon("./icon/bootstrap/graph-up-arrow.svg"))
@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+
+class instru_batch:
+    """
+    包装一个仪器连接（instru_socket、instru_serial、pyvisa 资源），合并连续的 write
+    write 只是暂存，flush() 时用 ';' 拼成一条消息一次发出；
+    query / ask 时把暂存的命令放在查询前面一起发送，只读一次应答（读操作推迟到真正需要结果时）
+    其余属性（read_raw 等）访问前先 flush，再转发给被包装的连接
+    """
+
+    def __init__(self, instr):
+        object.__setattr__(self, 'instr', instr)
+        object.__setattr__(self, 'pending', [])
+
+    @staticmethod
+    def _rooted(cmd):
+        # ';' 之后的命令默认相对上一条命令的子系统，补 ':' 从根开始解析；公共命令 *XXX 不需要
+        cmd = cmd.strip()
+        return cmd if cmd.startswith((':', '*')) else ':' + cmd
+
+    def _join(self, cmd=None):
+        cmds = self.pending + ([cmd] if cmd is not None else [])
+        self.pending.clear()
+        if len(cmds) == 1:
+            return cmds[0]
+        return ';'.join(self._rooted(c) for c in cmds)
+
+    def write(self, cmd):
+        self.pending.append(cmd)
+
+    def flush(self):
+        if self.pending:
+            self.instr.write(self._join())
+
+    def discard(self):
+        self.pending.clear()
+
+    def query(self, cmd):
+        return self.instr.query(self._join(cmd))
+
+    def ask(self, cmd):
+        return self.instr.ask(self._join(cmd))
+
+    def __getattr__(self, name):
+        self.flush()
+        return getattr(self.instr, name)
+
+    def __setattr__(self, name, value):
+        self.flush()
+        setattr(self.instr, name, value)
+
+
+@contextmanager
+def batched(device):
+    """
+    在 with 块内把 device.instr 换成 instru_batch，块内驱动方法发出的写命令合并成一条消息，
+    正常退出时发送，出错时丢弃未发送的命令；退出后恢复原连接
+        with batched(m_instru):
+            m_instru.setChannelCouple(...)
+            m_instru.setChannelOffet(...)
+    """
+    instr = device.instr
+    if isinstance(instr, instru_batch):
+        # 已在批处理中，直接并入外层
+        yield instr
+        return
+    batch = instru_batch(instr)
+    device.instr = batch
+    try:
+        yield batch
+        batch.flush()
+    finally:
+        batch.discard()
+        device.instr = instr
@@ -1,13 +1,61 @@
 import serial
 
 class instru_serial(serial.Serial):
+    """
+    SCPI over serial，接口与 instru_socket 一致
+    应答按帧读取: IEEE 488.2 定长块 #<n><len><数据> 或以 \\n 结尾的 ASCII 行
+    """
 
     def ask(self,cmd):
-        self.write((cmd).encode("utf-8"))
-        return(self.readline().decode())
+        """发送查询，返回完整应答文本（定长块含 #<n><len> 头）"""
+        self.write(cmd)
+        frame, _ = self.read_response()
+        return bytes(frame).decode()
+
+    def ask_block(self,cmd):
+        """发送查询，返回定长块数据部分的 memoryview"""
+        self.write(cmd)
+        frame, payload = self.read_response()
+        if len(frame) == len(payload) or frame[0] != ord('#'):
+            raise ValueError(f"Response is not a definite-length block: {bytes(frame[:32])!r}")
+        return payload
 
     def query(self,cmd):
         return self.ask(cmd)
-        
+
     def write(self,cmd):
-        self.write((cmd).encode("utf-8"))
\ No newline at end of file
+        # 必须调用 serial.Serial.write，调用 self.write 会无限递归
+        super().write((cmd+"\n").encode("utf-8"))
+
+    def read_response(self):
+        """读取一帧应答，返回 (整帧, 数据部分) 两个 memoryview，超时未读完时抛出 TimeoutError"""
+        first = self._read_exact(1)
+        if getattr(self, '_after_block', False):
+            # 定长块之后的结束符留到下一帧开头再跳过
+            self._after_block = False
+            while first in (b'\r', b'\n'):
+                first = self._read_exact(1)
+        if first == b'#':
+            n = self._read_exact(1)
+            if not n.isdigit():
+                raise ValueError(f"Bad block header: {first + n!r}")
+            if n != b'0':
+                digits = self._read_exact(int(n))
+                frame = bytearray(first + n + digits)
+                header = len(frame)
+                frame += self._read_exact(int(digits))
+                self._after_block = True
+                view = memoryview(frame)
+                return view, view[header:]
+        line = first + self.readline()
+        if not line.endswith(b'\n'):
+            raise TimeoutError(f"Timeout while reading response: {line[:32]!r}")
+        view = memoryview(line)
+        start = 2 if line.startswith(b'#0') else 0
+        return view, view[start:len(line.rstrip(b'\r\n'))]
+
+    def _read_exact(self, size):
+        data = self.read(size)
+        if len(data) < size:
+            raise TimeoutError(f"Timeout: {len(data)}/{size} bytes read")
+        return data
@@ -1,6 +1,13 @@
 import socket
 
+BUFFER_SIZE = 1 << 20   # 接收缓冲区初始大小，放不下一帧时按 2 倍扩大
+
 class instru_socket(socket.socket):
+    """
+    SCPI over TCP
+    应答按帧读取: IEEE 488.2 定长块 #<n><len><数据> 或以 \\n 结尾的 ASCII 行，
+    数据用 recv_into 直接收进可复用的 bytearray，不再按 1024 字节小块拼接，也不会在 TCP 分包处截断
+    """
 
     # def ask(self,cmd):
     #     self.send((cmd+"\r\n").encode("utf-8"))
@@ -10,19 +17,99 @@ class instru_socket(socket.socket):
     #     return(msg)
 
     def ask(self,cmd):
-        self.send((cmd+"\n").encode("utf-8"))
-        #读取所有返回内容，直到缓冲区为空
-        msg = ""
-        while True:
-            part = self.recv(1024).decode()
-            msg += part
-            if len(part) < 1024:
-                break
-        return(msg)
-    
+        """发送查询，返回完整应答文本（定长块含 #<n><len> 头，与原先一致）"""
+        self.write(cmd)
+        frame, _ = self.read_response()
+        return bytes(frame).decode()
+
+    def ask_block(self,cmd):
+        """发送查询，返回定长块数据部分的 memoryview（零拷贝，下一次读取前有效）"""
+        self.write(cmd)
+        frame, payload = self.read_response()
+        if len(frame) == len(payload) or frame[0] != ord('#'):
+            raise ValueError(f"Response is not a definite-length block: {bytes(frame[:32])!r}")
+        return payload
+
     def query(self,cmd):
         return self.ask(cmd)
-        
+
     def write(self,cmd):
         self.send((cmd+"\n").encode("utf-8"))
-    
\ No newline at end of file
+
+    # ---------- 分帧读取 ----------
+    def read_response(self):
+        """
+        读取一帧应答，返回 (整帧, 数据部分) 两个 memoryview，均指向接收缓冲区，下一次读取前有效
+        定长块的数据部分为 <len> 字节原始数据；ASCII 行的数据部分不含结尾的 \\r\\n
+        """
+        self._fill(1)
+        if self._after_block:
+            # 定长块之后的结束符留到下一帧开头再跳过，避免为等它阻塞
+            self._after_block = False
+            while self._rbuf[self._head] in b'\r\n':
+                self._head += 1
+                self._fill(1)
+        if self._rbuf[self._head] == ord('#'):
+            self._fill(2)
+            n = self._rbuf[self._head + 1] - ord('0')
+            if n < 0 or n > 9:
+                raise ValueError(f"Bad block header: {bytes(self._rbuf[self._head:self._head + 2])!r}")
+            if n > 0:
+                self._fill(2 + n)
+                length = int(self._rbuf[self._head + 2:self._head + 2 + n])
+                self._fill(2 + n + length)
+                start = self._head
+                self._head += 2 + n + length
+                self._after_block = True
+                view = memoryview(self._rbuf)
+                return view[start:self._head], view[start + 2 + n:self._head]
+            # #0 为不定长块，以换行结束
+            frame = self._read_line()
+            return frame, frame[2:len(frame) - self._eol_len(frame)]
+        frame = self._read_line()
+        return frame, frame[:len(frame) - self._eol_len(frame)]
+
+    def _read_line(self):
+        scanned = 0
+        while True:
+            idx = self._rbuf.find(b'\n', self._head + scanned, self._tail)
+            if idx >= 0:
+                break
+            scanned = self._tail - self._head
+            self._fill(scanned + 1)
+        start = self._head
+        self._head = idx + 1
+        return memoryview(self._rbuf)[start:self._head]
+
+    @staticmethod
+    def _eol_len(frame):
+        if len(frame) >= 2 and frame[-2] == ord('\r'):
+            return 2
+        return 1
+
+    def _fill(self, need):
+        """保证缓冲区中至少有 need 字节未读数据"""
+        if not hasattr(self, '_rbuf'):
+            self._rbuf = bytearray(BUFFER_SIZE)
+            self._head = 0      # 未读数据起点
+            self._tail = 0      # 未读数据终点
+            self._after_block = False
+        while self._tail - self._head < need:
+            if self._head + need > len(self._rbuf):
+                pending = self._tail - self._head
+                if need > len(self._rbuf):
+                    # 放不下一帧: 换一块更大的缓冲区，已返回的 memoryview 仍指向旧缓冲区
+                    size = len(self._rbuf)
+                    while size < need:
+                        size *= 2
+                    buf = bytearray(size)
+                    buf[:pending] = self._rbuf[self._head:self._tail]
+                    self._rbuf = buf
+                else:
+                    # 把未读数据移到缓冲区开头（等长赋值，不改变缓冲区大小）
+                    self._rbuf[:pending] = self._rbuf[self._head:self._tail]
+                self._head, self._tail = 0, pending
+            n = self.recv_into(memoryview(self._rbuf)[self._tail:])
+            if n == 0:
+                raise ConnectionError("Connection closed by instrument")
+            self._tail += n
@@ -0,0 +1,47 @@
+import time
+
+class instru_stats:
+    """
+    包装一个仪器连接（pyvisa 资源、socket、instru_socket 等），统计发送的消息数、SCPI 命令数、往返次数和耗时
+    发送类方法（write、query、send 等）被计数，其余属性原样转发给被包装的连接
+    一条消息中用 ';' 拼接的多条命令计为多条命令、一条消息；消息中含查询时计为一次往返
+    """
+    SEND_METHODS = ('write', 'send', 'sendall', 'query', 'ask', 'ask_block',
+                    'query_ascii_values', 'query_binary_values')
+
+    def __init__(self, instr):
+        object.__setattr__(self, 'instr', instr)
+        self.reset()
+
+    def reset(self):
+        object.__setattr__(self, 'messages', 0)
+        object.__setattr__(self, 'commands', 0)
+        object.__setattr__(self, 'round_trips', 0)
+        object.__setattr__(self, 'start', time.perf_counter())
+
+    def _count(self, cmd):
+        if isinstance(cmd, (bytes, bytearray, memoryview)):
+            cmd = bytes(cmd).decode('utf-8', errors='replace')
+        cmds = [c for c in str(cmd).strip().split(';') if c.strip()]
+        object.__setattr__(self, 'messages', self.messages + 1)
+        object.__setattr__(self, 'commands', self.commands + len(cmds))
+        if any('?' in c for c in cmds):
+            object.__setattr__(self, 'round_trips', self.round_trips + 1)
+
+    def __getattr__(self, name):
+        attr = getattr(self.instr, name)
+        if name in self.SEND_METHODS and callable(attr):
+            def counted(cmd, *args, **kwargs):
+                self._count(cmd)
+                return attr(cmd, *args, **kwargs)
+            return counted
+        return attr
+
+    def __setattr__(self, name, value):
+        # 如 inst.timeout = 20000，设置到被包装的连接上
+        setattr(self.instr, name, value)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        return (f"{self.messages} messages, {self.commands} SCPI commands, "
+                f"{self.round_trips} round-trips, {elapsed * 1e3:.1f} ms")
@@ -1,6 +1,7 @@
 import os
-import subprocess
 import sys
+import time
+import numpy as np
 #=============== MultiProcessing ===============#
 from multiprocessing import Process, Queue
 #===============PyQt5===============#
@@ -18,9 +19,15 @@ from control_widget import ControlWidget
 from plot_widget import PlotWidget
 from trace_widget import TraceWidget
 from custom_ribbon_bar import customRibbonBar
+from meas_runner import MeasRunner, vna_argv
 
 #===============加载xConv================#
-from xConv.xConv import xConvS2PReader, xConvFormulaTransformer
+from xConv.xConv import xConvS2PReader, xConvFormulaTransformer, xConvEvalContext, sparam_dataset
+
+# 测量结果文件，Meas 类曲线引用该路径
+MEAS_FILE = ".\\data\\measurement.s2p"
+# 连续测量时曲线刷新的最高帧率，更快到达的扫描结果只显示最新一帧
+MAX_FPS = 20
 
 class BodeAnalyzer(QMainWindow):
     def __init__(self):
@@ -30,8 +37,17 @@ class BodeAnalyzer(QMainWindow):
         self.s2pdata = None
         self.trace_param = {}
         self.xConv = xConvFormulaTransformer()
-        self.checkLifeTime = QTimer()
-        self.checkLifeTime.timeout.connect(self.check_lifetime)
+        # 最近一次测量的数据集（内存中），引用 MEAS_FILE 的曲线直接使用它
+        self.meas_data = None
+        self.meas_runner = None
+        # 流式测量时需要逐段更新的曲线 [(wave_key, 曲线名, 表达式)]，由 update_plot 记录
+        self.stream_traces = []
+        self.stream_formulas = {}
+        # 连续测量: 按固定帧率从 runner 的 mailbox 取最新一帧
+        self.frame_timer = QTimer()
+        self.frame_timer.setInterval(int(1000 / MAX_FPS))
+        self.frame_timer.timeout.connect(self._show_latest_frame)
+        self._rate_mark = (0.0, 0)
         self.setWindowTitle("xFRA - A Universal Frequency Response Analyzer ")
         self.resize(1920, 1080)
         self._create_menu()
@@ -98,18 +114,45 @@ class BodeAnalyzer(QMainWindow):
         
         # 清空plot_widget中所有的waveWidget
         self.plot.del_all_wave_widget()
-        # 获取trace_param中的每一条trace信息，并按照x-axis类型添加到对应的waveWidget中
+        # 公式定义每次刷新只读一次；每个文件只建立一个求值上下文，引用同一文件的曲线共用
+        formulas = xConvFormulaTransformer.read_formula_file("xConv\\xConvFormulaDef.json") or {}
+        contexts = {}
+        meas_key = os.path.normcase(os.path.abspath(MEAS_FILE))
+        self.stream_traces = []
+        self.stream_formulas = formulas
+        traces = {}   # 文件 -> 引用该文件的曲线
+        active = []   # 按原顺序保存未删除的曲线
         for trace_param in self.trace_param.values():
             # 如果trace_param已被删除，则跳过
             if trace_param.get('deleted', False):
                 continue
             # 读取S2P的数据
-            s2pdata = self.load_s2p_file(trace_param['snp_file_path'])
-            xConv= xConvFormulaTransformer()
-            xConv.load_formulas(s2pdata, "xConv\\xConvFormulaDef.json")
+            key = os.path.normcase(os.path.abspath(trace_param['snp_file_path']))
+            if key not in contexts:
+                if key == meas_key and self.meas_data is not None:
+                    data = self.meas_data
+                else:
+                    data = self.load_s2p_file(trace_param['snp_file_path'])
+                # 绘图只需单精度，导出仍按双精度计算
+                contexts[key] = xConvEvalContext(data, formulas, precision='display')
+                traces[key] = []
+            traces[key].append(trace_param)
+            active.append((key, trace_param))
+        # 每个文件的全部表达式一起计算，公共子表达式（如 z11、abs(z11)）只算一次
+        y_results = {}
+        for key, ctx in contexts.items():
+            results, stats = ctx.evaluate_batch([t['expression'] for t in traces[key]])
+            for trace_param, y in zip(traces[key], results):
+                y_results[id(trace_param)] = y
+            if stats['saved']:
+                print(f"{key}: 公共子表达式节省 {stats['saved']}/{stats['total']} 次计算")
+            if stats['cache_hits']:
+                print(f"{key}: {stats['cache_hits']} 条公式命中结果缓存")
+        # 获取trace_param中的每一条trace信息，并按照x-axis类型添加到对应的waveWidget中
+        for key, trace_param in active:
             # 计算x_data和y_data
-            x_data = s2pdata['freq']
-            y_data = xConv.apply_formula(s2pdata, trace_param['expression'])
+            x_data = contexts[key].freq
+            y_data = y_results[id(trace_param)]
             freq_axis = trace_param['x_axis_scale'].lower()
             # 根据坐标类型决定添加到哪个waveWidget
             if freq_axis == 'log':
@@ -126,6 +169,8 @@ class BodeAnalyzer(QMainWindow):
                 trace_name = trace_param['category']+"_"+trace_param['format']
             else:
                 trace_name = trace_param['expression']
+            if key == meas_key:
+                self.stream_traces.append((wave_key, trace_name, trace_param['expression']))
             # 添加trace到对应的waveWidget
             self.plot.add_trace(
                 wave_key=wave_key,
@@ -138,14 +183,8 @@ class BodeAnalyzer(QMainWindow):
             )
     # ---------- 读取文件，返回一个s2p数据字典 ----------
     def load_s2p_file(self, path: str):
-        # 去除文件路径的拓展名
-        base_path = os.path.splitext(path)[0]
-        if not base_path.endswith('_RI'):
-            print("Converting file to RI format using xConv...")
-            os.system('python ./xConv/xConvSNPConverter.py {}'.format(path))
-            reader = xConvS2PReader(base_path + '_RI.s2p')
-        else:
-            reader = xConvS2PReader(path)
+        # xConvS2PReader 直接在内存中解码 RI/MA/DB，无需先转换成 _RI 文件
+        reader = xConvS2PReader(path)
         return reader.read()
 
 
@@ -162,7 +201,7 @@ class BodeAnalyzer(QMainWindow):
         except Exception as e:
             print(f"Failed to load data: {e}")
 
-    def _start_meas(self):
+    def _start_meas(self, continuous: bool = False):
         d = self.ctrl.get_params()
         # 检查d有无空元素
         for k, v in d.items():
@@ -175,25 +214,75 @@ class BodeAnalyzer(QMainWindow):
             if v is None:
                 print(f"Parameter {k} is not set. Please check control panel.")
                 return
-        print("Starting single measurement...")
-        if d['device_type'] == 'VNA':
-            cmd = f'python .\\xDriver\\VNA_Class\\{d["device_m_model"]}.py --device-address {d["device_m_address"]} ' + \
-                    f'--device-tunnel {d["device_tunnel"]} --start-freq {d["fstart"]} --stop-freq {d["fstop"]} ' + \
-                    f'--sweep-type {"LOG" if d["sweep_mode"] else "LIN"} --sweep-points {d["points"]} ' + \
-                    f'--averages {d["average"]} --ifbw {d["rbw"]} --source-level {d["level"]} --output-file .\\data\\measurement.s2p '
-        if cmd is not None:
-            # 新开一个进程，进程执行os.system(cmd)命令，以免阻塞主进程
-            self.meas_process = subprocess.Popen(cmd, shell=True)
-            # print(f"Executing command: {cmd}")
-            self.checkLifeTime.start(100)  # Check every second
-
-    def check_lifetime(self):
-        if self.meas_process.poll() is not None:  # Process has finished
-            print("Measurement process finished.")
-            self.checkLifeTime.stop()
-            self.load_s2p_file(".\\data\\measurement.s2p")
-            print("Data loaded successfully.")
-            self.update_plot()
+        if self.meas_runner is not None and self.meas_runner.isRunning():
+            print("Measurement already running.")
+            return
+        if d['device_type'] != 'VNA':
+            print(f"Device type {d['device_type']} is not supported by the measurement runner yet.")
+            return
+        print("Starting continuous measurement..." if continuous else "Starting single measurement...")
+        # 驱动在工作线程中进程内运行，结果通过信号直接送回，不再经由子进程和磁盘文件
+        self.meas_runner = MeasRunner(d["device_m_model"], vna_argv(d, MEAS_FILE),
+                                      continuous=continuous, parent=self)
+        self.meas_runner.sweep_started.connect(self._on_sweep_started)
+        self.meas_runner.block_ready.connect(self._on_sweep_block)
+        self.meas_runner.sweep_done.connect(self._on_sweep_done)
+        self.meas_runner.failed.connect(lambda msg: print(f"Measurement failed: {msg}"))
+        self.meas_runner.finished.connect(self.frame_timer.stop)
+        self.meas_runner.start()
+        if continuous:
+            self._rate_mark = (time.perf_counter(), 0)
+            self.frame_timer.start()
+
+    def _stop_meas(self):
+        if self.meas_runner is not None and self.meas_runner.isRunning():
+            print("Stopping measurement...")
+            self.meas_runner.requestInterruption()
+
+    def _show_latest_frame(self):
+        box = self.meas_runner.mailbox if self.meas_runner is not None else None
+        if box is None:
+            return
+        frame = box.take()
+        now = time.perf_counter()
+        t0, n0 = self._rate_mark
+        if now - t0 >= 1.0:
+            rate = (box.published - n0) / (now - t0)
+            self.statusBar().showMessage(f"Continuous: {rate:.2f} sweeps/s, {box.dropped} stale frames dropped")
+            self._rate_mark = (now, box.published)
+        if frame is None:
+            return
+        # frame 是 mailbox 的预分配缓冲区，只保证在下一次 take() 之前不被改写，
+        # 只用于这次就地刷新曲线；留给 update_plot 的 meas_data 保存副本，避免读到工作线程正在写入的缓冲区
+        self._update_stream(0, sparam_dataset(box.freq, frame))
+        self.meas_data = sparam_dataset(box.freq, frame.copy())
+
+    def _on_sweep_started(self, freqs):
+        # 先用 nan 占位建立全部曲线，之后每段数据只计算并写入该段
+        n = len(freqs)
+        self.meas_data = sparam_dataset(freqs, np.full((n, 2, 2), np.nan, dtype=np.complex128))
+        self.update_plot()
+
+    def _on_sweep_block(self, start: int, block: dict):
+        stop = start + len(block['freq'])
+        if self.meas_data is not None:
+            self.meas_data['s'][start:stop] = block['s']
+        self._update_stream(start, block)
+
+    def _update_stream(self, start: int, block: dict):
+        """只计算 block 覆盖的频率段并写入已有曲线，不重建 waveWidget"""
+        if not self.stream_traces:
+            return
+        ctx = xConvEvalContext(block, self.stream_formulas, precision='display')
+        results, _ = ctx.evaluate_batch([expr for _, _, expr in self.stream_traces])
+        for (wave_key, name, _), y in zip(self.stream_traces, results):
+            self.plot.set_trace_block(wave_key, name, start, np.broadcast_to(y, block['freq'].shape))
+
+    def _on_sweep_done(self, data: dict):
+        print("Measurement finished.")
+        self.frame_timer.stop()
+        self.meas_data = data
+        self.update_plot()
 
     def _connect_signals(self):
         # ribbon 新建按钮 -> 刷新曲线
@@ -212,7 +301,9 @@ class BodeAnalyzer(QMainWindow):
         # ribbon 添加circuit fit按钮 -> 在trace widget中添加circuit fit box
         self.ribbon.add_circuit_fit_btn.clicked.connect(lambda: self.trace.dw.add_box(box_type='circuit_fit'))
         # 点击启动按钮，开始扫描
-        self.ribbon.single_meas_button.clicked.connect(self._start_meas)
+        self.ribbon.single_meas_button.clicked.connect(lambda: self._start_meas())
+        self.ribbon.cont_meas_button.clicked.connect(lambda: self._start_meas(continuous=True))
+        self.ribbon.stop_meas_button.clicked.connect(self._stop_meas)
         # 控制面板改动 -> 刷新曲线
         self.trace.params_changed.connect(self.trace_params_changed)
         
@@ -0,0 +1,173 @@
+import importlib.util
+import threading
+import traceback
+from pathlib import Path
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from xConv.xConv import sparam_dataset
+
+VNA_PATH = Path('./xDriver/VNA_Class/')
+# 已导入的驱动模块，按型号缓存，同一型号只导入一次
+_drivers = {}
+
+
+def load_vna_driver(model: str):
+    """从 xDriver/VNA_Class/<model>.py 导入驱动模块（进程内，不再启动新的解释器）"""
+    if model not in _drivers:
+        path = VNA_PATH / f"{model}.py"
+        if not path.exists():
+            raise FileNotFoundError(f"驱动文件不存在: {path}")
+        spec = importlib.util.spec_from_file_location(f"xDriver_VNA_{model}", path)
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        for func in ('parse_arguments', 'open_session', 'sweep', 'close_session'):
+            if not hasattr(mod, func):
+                raise AttributeError(f"{path} 没有实现 {func}()，见 xDriver/xDriverStd.md")
+        _drivers[model] = mod
+    return _drivers[model]
+
+
+def vna_argv(d: dict, output_file: str):
+    """控制面板参数 -> 驱动命令行参数列表（与命令行调用驱动时一致）"""
+    return ['--device-address', str(d['device_m_address']),
+            '--device-tunnel', str(d['device_tunnel']),
+            '--start-freq', str(d['fstart']), '--stop-freq', str(d['fstop']),
+            '--sweep-type', 'LOG' if d['sweep_mode'] else 'LIN',
+            '--sweep-points', str(d['points']),
+            '--averages', str(d['average']), '--ifbw', str(d['rbw']),
+            '--source-level', str(d['level']), '--output-file', output_file]
+
+
+class FrameMailbox:
+    """
+    连续测量的单槽最新帧邮箱（三缓冲）
+    工作线程把每次扫描写入 back() 后 publish()；界面定时 take() 最新一帧，
+    未被取走的旧帧直接被新帧覆盖（计入 dropped）
+    三块缓冲区预先分配并循环复用，界面取走的帧在下一次 take() 之前不会被改写
+    """
+
+    def __init__(self, freq, n_ports: int = 2):
+        self.freq = np.asarray(freq, dtype=np.float64)
+        shape = (len(self.freq), n_ports, n_ports)
+        self._bufs = [np.empty(shape, dtype=np.complex128) for _ in range(3)]
+        self._lock = threading.Lock()
+        self._back = 0       # 工作线程正在写入
+        self._ready = None   # 最新的完整帧，尚未被取走
+        self._front = None   # 界面当前持有
+        self.published = 0
+        self.dropped = 0
+
+    def back(self) -> np.ndarray:
+        return self._bufs[self._back]
+
+    def publish(self):
+        with self._lock:
+            if self._ready is not None:
+                self.dropped += 1
+            self._ready = self._back
+            self._back = next(k for k in range(3) if k not in (self._ready, self._front))
+            self.published += 1
+
+    def take(self):
+        """取走最新一帧，没有新帧时返回 None"""
+        with self._lock:
+            if self._ready is None:
+                return None
+            self._front, self._ready = self._ready, None
+            return self._bufs[self._front]
+
+
+class MeasRunner(QThread):
+    """
+    在工作线程中运行 VNA 测量
+    驱动在进程内导入，测量结果以 xConvS2PReader.read() 格式的数据集通过 sweep_done 直接交给界面，
+    随后在工作线程中把同一份数据写入 output_file 以便保存
+    驱动实现了 sweep_blocks 时，扫描过程中每收到一段数据就通过 block_ready 发出
+    continuous=True 时保持连接、连续重复扫描，每帧写入 mailbox 由界面按帧率取用，
+    requestInterruption() 后结束，最后一帧完整扫描通过 sweep_done 发出
+    """
+    sweep_started = pyqtSignal(object)     # 完整频率网格
+    block_ready = pyqtSignal(int, object)  # 起始下标, 该段的数据集 dict
+    sweep_done = pyqtSignal(object)   # 数据集 dict
+    failed = pyqtSignal(str)          # 错误信息
+
+    def __init__(self, model: str, argv: list, continuous: bool = False, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.argv = argv
+        self.continuous = continuous
+        self.mailbox = None
+
+    def run(self):
+        try:
+            drv = load_vna_driver(self.model)
+            args = drv.parse_arguments(self.argv)
+            session = drv.open_session(args)
+            try:
+                if self.continuous:
+                    freqs, s = self._sweep_continuous(drv, session, args)
+                elif hasattr(drv, 'sweep_blocks'):
+                    freqs, s = self._sweep_streamed(drv, session, args)
+                else:
+                    freqs, s = drv.sweep(session, args)
+            finally:
+                drv.close_session(session)
+            if s is None:
+                print("Measurement stopped.")
+                return
+            self.sweep_done.emit(sparam_dataset(freqs, s))
+            if args.output_file and hasattr(drv, 'write_s2p'):
+                drv.write_s2p(args.output_file, freqs, s)
+        except (Exception, SystemExit) as e:   # argparse 参数错误时抛出 SystemExit
+            traceback.print_exc()
+            self.failed.emit(f"{type(e).__name__}: {e}")
+
+    def _fill(self, drv, session, args, freqs, s, on_block=None) -> bool:
+        """
+        扫描一次写入 freqs / s，完成返回 True，中途被停止返回 False
+        有 sweep_blocks 时逐段写入并可在段间停止
+        """
+        if not hasattr(drv, 'sweep_blocks'):
+            f, d = drv.sweep(session, args)
+            freqs[:] = f
+            s[:] = d
+            return not self.isInterruptionRequested()
+        blocks = drv.sweep_blocks(session, args)
+        try:
+            for start, f, blk in blocks:
+                stop = start + len(f)
+                freqs[start:stop] = f
+                s[start:stop] = blk
+                if on_block is not None:
+                    on_block(start, f, blk)
+                if self.isInterruptionRequested():
+                    return False
+        finally:
+            blocks.close()  # 中途退出时让驱动先恢复仪器状态，再关闭会话
+        return True
+
+    def _sweep_streamed(self, drv, session, args):
+        freqs = np.array(drv.sweep_freqs(args), dtype=np.float64)
+        s = np.empty((len(freqs), 2, 2), dtype=np.complex128)
+        self.sweep_started.emit(freqs.copy())
+        done = self._fill(drv, session, args, freqs, s,
+                          lambda start, f, blk: self.block_ready.emit(start, sparam_dataset(f, blk)))
+        return (freqs, s) if done else (None, None)
+
+    def _sweep_continuous(self, drv, session, args):
+        freqs = np.array(drv.sweep_freqs(args), dtype=np.float64)
+        self.mailbox = FrameMailbox(freqs)
+        self.sweep_started.emit(freqs.copy())
+        # 频率网格固定，驱动返回的频率写入临时数组，不影响 mailbox.freq
+        scratch = freqs.copy()
+        last = None
+        while not self.isInterruptionRequested():
+            buf = self.mailbox.back()
+            if not self._fill(drv, session, args, scratch, buf):
+                break
+            self.mailbox.publish()
+            last = buf
+        if last is None:
+            return None, None
+        return freqs, last.copy()
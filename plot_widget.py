@@ -70,6 +70,9 @@ class PlotWidget(QWidget):
                 unit=unit,
                 label=label
             )
+    def set_trace_block(self, wave_key, name, start, y_block):
+        if wave_key in self.wave_widget:
+            self.wave_widget[wave_key].set_trace_block(name, start, y_block)
     def remove_trace(self, wave_key, name=""):
         if wave_key in self.wave_widget:
             self.wave_widget[wave_key].remove_trace(name)
@@ -5,50 +5,336 @@ from typing import Dict, Tuple, List, Any
 import warnings
 import json
 import os
+import mmap
+import hashlib
+import logging
+import ast
+import copy
+import functools
+
+try:
+    from .xConvSNPConverter import FREQ_MUL, snp_n_ports, infer_n_ports, record_width, unpack_records
+    from .xConvSNPCache import xConvSNPCache, content_hash
+    from .xConvFusedEval import compile_plan, Unfusable
+    from .xConvResultCache import xConvResultCache, result_key
+except ImportError:     # 以脚本方式运行时 xConv 不是包
+    from xConvSNPConverter import FREQ_MUL, snp_n_ports, infer_n_ports, record_width, unpack_records
+    from xConvSNPCache import xConvSNPCache, content_hash
+    from xConvFusedEval import compile_plan, Unfusable
+    from xConvResultCache import xConvResultCache, result_key
+
+logger = logging.getLogger(__name__)
+
+# 注释: '!' 到行尾
+_COMMENT_RE_B = re.compile(rb'!.*')
+# Touchstone v2 关键字行: [Keyword] 其余内容
+_KEYWORD_RE_B = re.compile(rb'^[ \t]*\[([^\]\n]*)\]([^\n]*)', re.M)
+# 超过该大小的文件改用 memory-map 分块解析，避免整份文本常驻内存
+LARGE_FILE_BYTES = 32 << 20
+CHUNK_BYTES = 4 << 20
+# 已编译公式的缓存容量（按公式文本）
+FORMULA_CACHE_SIZE = 256
+
+def sparam_names(n_ports: int) -> List[Tuple[str, int, int]]:
+    """返回 [(名称, i, j), ...]，名称如 s11、s21；端口数 >= 10 时写作 s1_10 以免歧义"""
+    sep = '_' if n_ports >= 10 else ''
+    return [(f's{i + 1}{sep}{j + 1}', i, j) for i in range(n_ports) for j in range(n_ports)]
+
 
 class xConvS2PReader:
-    """读取Touchstone s2p文件并提取S参数"""
+    """
+    读取Touchstone sNp文件（.s1p ~ .s16p，v1 或 v2）并提取S参数
+    v2 文件按关键字分段: 只解析 [Network Data]，跳过 [Noise Data] 和 [Begin/End Information]，
+    支持逐端口 [Reference]、[Two-Port Data Order] 以及 Full / Lower / Upper 矩阵格式
+    """
     
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, use_cache: bool = True, cache: xConvSNPCache = None):
         self.file_path = file_path
+        # 二进制缓存：命中时直接 memory-map，不再解析文本
+        self.cache = (cache or xConvSNPCache()) if use_cache else None
         self.freq = None  # 频率数组 (Hz)
-        self.s11 = None   # S11复数数组
-        self.s12 = None   # S12复数数组
-        self.s21 = None   # S21复数数组
-        self.s22 = None   # S22复数数组
-        self.z0 = 50.0    # 参考阻抗
+        self.s = None     # S参数矩阵 (点数, N, N) complex128，C 连续
+        self.n_ports = snp_n_ports(file_path)  # 端口数，扩展名无法判断时由数据推断
+        self.z0 = 50.0    # 参考阻抗（v2 逐端口阻抗时为端口 1 的阻抗）
+        self.z0_ports = None  # v2 [Reference] 给出的逐端口参考阻抗
         self.freq_unit = None  # 频率单位
+        self.data_format = 'RI'  # 数据格式: RI / MA / DB
+        self.version = 1  # Touchstone 版本
+        self.matrix_format = 'Full'  # v2 [Matrix Format]: Full / Lower / Upper
+        self.two_port_order = '21_12'  # 2 端口数据顺序，v1 固定为 21_12
+        self.n_freq = None  # v2 [Number of Frequencies]，用于预分配
+        self.hash = None  # 源文件内容哈希，用作公式结果缓存的键
+        self._src_stat = None  # 读取源文件前的 os.stat，写入缓存时使用
+        self._section = None  # 当前所在的 v2 关键字段
+        self._first_option = True
         
     def read(self) -> Dict[str, Any]:
         """
-        读取s2p文件并返回S参数字典
-        返回: {'freq': array, 's11': array, 's12': array, 's21': array, 's22': array, 'z0': float}
+        读取sNp文件并返回S参数字典
+        返回: {'freq': array, 's11': array, 's12': array, ..., 's': (点数, N, N) array, 'n_ports': int,
+               'z0': float, 'z0_ports': (N,) array, 'hash': 源文件内容哈希}
+        其中 sij 是 s[:, i-1, j-1] 的视图，不复制数据
         """
-        with open(self.file_path, 'r') as f:
-            lines = f.readlines()
-        
-        # 解析选项行和数据
-        data_lines = []
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('!'):
-                continue
-            if line.startswith('#'):
-                self._parse_option_line(line)
-            else:
-                data_lines.append(line)
-        
+        if self.cache is not None and self._load_cache():
+            return self._result()
+        if os.path.getsize(self.file_path) > LARGE_FILE_BYTES:
+            return self.read_chunked()
+
+        # 读取前取 stat，缓存记录的大小/mtime 与内容哈希对应同一版文件
+        self._src_stat = os.stat(self.file_path)
+        with open(self.file_path, 'rb') as f:
+            raw = f.read()
+
+        # 去掉注释、选项行和 v2 关键字，只留下网络数据
+        self._reset_scan()
+        data = self._scan(raw)
+
         # 解析数据
-        self._parse_data(data_lines)
-
-        return {
-            'freq': self.freq,
-            's11': self.s11,
-            's12': self.s12,
-            's21': self.s21,
-            's22': self.s22,
-            'z0': self.z0
-        }
+        self._parse_data(data.decode('utf-8', errors='replace'))
+
+        self.hash = content_hash(raw)
+        self._store_cache(self.hash)
+        return self._result()
+
+    def read_chunked(self, chunk_bytes: int = CHUNK_BYTES) -> Dict[str, Any]:
+        """
+        memory-map 文件并分块解析，结果写入预分配的数组，返回值与 read() 相同
+        适合数百 MB 的长时间漂移/扫描堆叠文件
+        """
+        hasher = hashlib.sha1()
+        self._src_stat = os.stat(self.file_path)
+        file_size = self._src_stat.st_size
+        freq = s = None
+        n = 0
+        for blk_freq, blk_s, pos in self._iter_records(chunk_bytes, hasher):
+            k = len(blk_freq)
+            if s is None or n + k > len(freq):
+                if s is None and self.n_freq:
+                    # v2 文件给出了 [Number of Frequencies]，一次分配到位
+                    capacity = max(self.n_freq, k)
+                else:
+                    # 按已解析部分的平均记录长度估算总点数，不足时按 1.5 倍扩容
+                    capacity = max(int((n + k) * file_size / pos * 1.02) + 1, int(1.5 * (n + k)))
+                new_freq = np.empty(capacity, dtype=np.float64)
+                new_s = np.empty((capacity, self.n_ports, self.n_ports), dtype=np.complex128)
+                if s is not None:
+                    new_freq[:n] = freq[:n]
+                    new_s[:n] = s[:n]
+                freq, s = new_freq, new_s
+            freq[n:n + k] = blk_freq
+            s[n:n + k] = blk_s
+            n += k
+        if s is None:
+            raise ValueError(f"文件中没有数据: {self.file_path}")
+        self._check_n_freq(n)
+        self._set_arrays(freq[:n], s[:n])
+        self.hash = hasher.hexdigest()
+        self._store_cache(self.hash)
+        return self._result()
+
+    def iter_blocks(self, chunk_bytes: int = CHUNK_BYTES):
+        """
+        逐块产生频率段，不把整份文件读入内存
+        每块为 {'freq': array, 's': (点数, N, N) array, 'sij': 视图, 'n_ports': int, 'z0': float, 'z0_ports': array}，
+        可直接传给 xConvFormulaTransformer.apply_formula
+        """
+        for freq, s, _ in self._iter_records(chunk_bytes):
+            block = {'freq': freq}
+            for name, i, j in sparam_names(self.n_ports):
+                block[name] = s[:, i, j]
+            block['s'] = s
+            block['n_ports'] = self.n_ports
+            block['z0'] = self.z0
+            block['z0_ports'] = self._z0_ports()
+            yield block
+
+    def _iter_records(self, chunk_bytes: int, hasher=None):
+        """按行边界切分 memory-map 后的文件，产生 (freq_hz, s, 已处理字节数)"""
+        carry = np.empty(0, dtype=np.float64)   # 跨块的不完整记录
+        self._reset_scan()
+        with open(self.file_path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm)
+            pos = 0
+            while pos < size:
+                end = min(pos + chunk_bytes, size)
+                if end < size:
+                    nl = mm.rfind(b'\n', pos, end)
+                    if nl < 0:
+                        nl = mm.find(b'\n', end)
+                    end = size if nl < 0 else nl + 1
+                chunk = mm[pos:end]
+                pos = end
+                if hasher is not None:
+                    hasher.update(chunk)
+
+                chunk = self._scan(chunk)
+                if self.n_ports is None:
+                    first_line = next((ln for ln in chunk.splitlines() if ln.strip()), None)
+                    if first_line is None:
+                        continue
+                    self.n_ports = infer_n_ports(first_line.decode())
+
+                values = np.array(chunk.split(), dtype=np.float64)
+                if carry.size:
+                    values = np.concatenate((carry, values))
+                width = record_width(self.n_ports, self.matrix_format)
+                n_full = values.size // width * width
+                carry = values[n_full:].copy()
+                if not n_full:
+                    continue
+                freq, s = unpack_records(values[:n_full], self.n_ports, self.data_format,
+                                         self.matrix_format, self.two_port_order)
+                if self.freq_unit in FREQ_MUL:
+                    freq *= FREQ_MUL[self.freq_unit]
+                yield freq, s, pos
+        if carry.size:
+            raise ValueError(f"文件末尾存在不完整的记录 ({carry.size} 个数): {self.file_path}")
+
+    # ---------- 文本预处理（v1 / v2 共用） ----------
+    def _reset_scan(self):
+        self._section = None
+        self._first_option = True
+        self._ref_values = []
+
+    def _scan(self, chunk: bytes) -> bytes:
+        """
+        去掉注释和选项行，处理 v2 关键字，返回属于网络数据的部分
+        chunk 需在行边界处切分；关键字段状态保存在 self 上，可跨块连续调用
+        """
+        if b'!' in chunk:
+            chunk = _COMMENT_RE_B.sub(b'', chunk)
+        # 解析选项行（只取第一行，其余忽略）
+        idx = chunk.find(b'#')
+        while idx >= 0:
+            nl = chunk.find(b'\n', idx)
+            nl = len(chunk) if nl < 0 else nl
+            if self._first_option:
+                self._parse_option_line(chunk[idx:nl].decode('utf-8', errors='replace'))
+                self._first_option = False
+            chunk = chunk[:idx] + chunk[nl:]
+            idx = chunk.find(b'#', idx)
+        if b'[' not in chunk and self._section in (None, 'NETWORK DATA'):
+            return chunk
+
+        pieces = []
+        pos = 0
+        for m in _KEYWORD_RE_B.finditer(chunk):
+            self._section_text(chunk[pos:m.start()], pieces)
+            self._parse_keyword(m.group(1).decode('utf-8', errors='replace'),
+                                m.group(2).decode('utf-8', errors='replace'))
+            pos = m.end()
+        self._section_text(chunk[pos:], pieces)
+        return b'\n'.join(pieces)
+
+    def _section_text(self, text: bytes, pieces: list):
+        """按当前关键字段分发两个关键字之间的文本"""
+        if self._section in (None, 'NETWORK DATA'):
+            # v1 文件没有关键字，选项行之后全部是网络数据
+            pieces.append(text)
+        elif self._section == 'REFERENCE':
+            # [Reference] 的阻抗可以跨多行
+            self._ref_values += text.split()
+
+    def _parse_keyword(self, keyword: str, rest: str):
+        """解析 v2 关键字行，如: [Number of Ports] 4"""
+        key = ' '.join(keyword.upper().split())
+        value = rest.strip()
+        if self._section == 'INFORMATION' and key != 'END INFORMATION':
+            return  # [Begin Information] 段内的内容不参与解析
+        if key == 'VERSION':
+            self.version = 2 if value.startswith('2') else 1
+            self._section = 'HEADER'
+        elif key == 'NUMBER OF PORTS':
+            self.n_ports = int(value)
+        elif key == 'TWO-PORT DATA ORDER':
+            self.two_port_order = value
+        elif key == 'NUMBER OF FREQUENCIES':
+            self.n_freq = int(value)
+        elif key == 'REFERENCE':
+            self._section = 'REFERENCE'
+            self._ref_values = value.split()
+        elif key == 'MATRIX FORMAT':
+            self.matrix_format = value.capitalize()
+        elif key == 'BEGIN INFORMATION':
+            self._section = 'INFORMATION'
+        elif key == 'NETWORK DATA':
+            self._section = 'NETWORK DATA'
+            if self._ref_values:
+                self.z0_ports = np.array(self._ref_values, dtype=np.float64)
+                self.z0 = float(self.z0_ports[0])
+        elif key in ('END INFORMATION', 'NUMBER OF NOISE FREQUENCIES', 'MIXED-MODE ORDER'):
+            if self._section not in ('NETWORK DATA', 'NOISE DATA'):
+                self._section = 'HEADER'
+        elif key in ('NOISE DATA', 'END'):
+            self._section = key
+        else:
+            logger.warning(f"忽略未知关键字 [{keyword}]: {self.file_path}")
+            if self._section in (None, 'REFERENCE'):
+                self._section = 'HEADER'
+        if self._section == 'REFERENCE' and key != 'REFERENCE':
+            self._section = 'HEADER'
+
+    def _check_n_freq(self, n: int):
+        if self.n_freq is not None and n != self.n_freq:
+            raise ValueError(f"[Number of Frequencies] 为 {self.n_freq}，实际读到 {n} 个点: {self.file_path}")
+
+    def _z0_ports(self) -> np.ndarray:
+        if self.z0_ports is not None:
+            return self.z0_ports
+        return np.full(self.n_ports, self.z0)
+
+    def _set_arrays(self, freq: np.ndarray, s: np.ndarray):
+        self.freq = freq
+        self.s = s
+        # sij 属性均为 self.s 的视图
+        for name, i, j in sparam_names(self.n_ports):
+            setattr(self, name, s[:, i, j])
+
+    def _store_cache(self, src_hash: str):
+        if self.cache is None:
+            return
+        try:
+            self.cache.store(self.file_path, src_hash, self.freq, self.s, src_stat=self._src_stat,
+                             n_ports=self.n_ports, z0=self.z0,
+                             z0_ports=self._z0_ports().tolist(), touchstone_version=self.version,
+                             freq_unit=self.freq_unit, data_format=self.data_format)
+        except OSError as e:
+            logger.warning(f"写入缓存失败 {self.file_path}: {e}")
+
+    def _load_cache(self) -> bool:
+        """尝试从二进制缓存加载，成功返回 True"""
+        try:
+            hit = self.cache.load(self.file_path)
+        except OSError as e:
+            logger.warning(f"读取缓存失败 {self.file_path}: {e}")
+            return False
+        if hit is None:
+            return False
+        meta, freq, s = hit
+        self.n_ports = meta['n_ports']
+        self.z0 = meta['z0']
+        if 'z0_ports' in meta:
+            self.z0_ports = np.array(meta['z0_ports'], dtype=np.float64)
+        self.version = meta.get('touchstone_version', 1)
+        self.hash = meta['hash']
+        self.freq_unit = meta['freq_unit']
+        self.data_format = meta['data_format']
+        self._set_arrays(freq, s)
+        logger.debug(f"Loaded {self.file_path} from cache")
+        return True
+
+    def _result(self) -> Dict[str, Any]:
+        result = {'freq': self.freq}
+        for name, i, j in sparam_names(self.n_ports):
+            result[name] = getattr(self, name)
+        result['s'] = self.s
+        result['n_ports'] = self.n_ports
+        result['z0'] = self.z0
+        result['z0_ports'] = self._z0_ports()
+        result['hash'] = self.hash
+        return result
+
     def _parse_option_line(self, line: str):
         """解析选项行，如: # HZ S RI R 50"""
         parts = line[1:].strip().upper().split()
@@ -56,49 +342,134 @@ class xConvS2PReader:
             self.freq_unit = parts[0]  # HZ, KHZ, MHZ, GHZ
             # 参数类型: S, Y, Z等
             # 格式: RI (实部/虚部), MA (幅度/相位), DB (dB/相位)
-            format_type = parts[2]
+            self.data_format = parts[2]
             if 'R' in parts:
                 r_idx = parts.index('R')
                 if r_idx + 1 < len(parts):
                     self.z0 = float(parts[r_idx + 1])
-    
-    def _parse_data(self, data_lines: List[str]):
-        """解析S参数数据行"""
-        freq = []
-        s11, s12, s21, s22 = [], [], [], []
-        
-        for line in data_lines:
-            values = [float(x) for x in line.split()]
-            if len(values) >= 9:  # 频率 + 8个S参数值
-                freq.append(values[0])
-                # 解析为复数 (实部, 虚部格式)
-                s11.append(complex(values[1], values[2]))
-                s21.append(complex(values[3], values[4]))
-                s12.append(complex(values[5], values[6]))
-                s22.append(complex(values[7], values[8]))
-                print(f"Parsed line: freq={values[0]}, S11={s11[-1]}, S12={s12[-1]}, S21={s21[-1]}, S22={s22[-1]}")
-        
+
+    def _parse_data(self, data_text: str):
+        """
+        解析S参数数据：整体切分为 float 数组后按 (点数, 记录宽度) 重排，兼容折行记录
+        v2 文件给出 [Number of Frequencies] 时先按点数预分配结果数组
+        """
+        if self.n_ports is None:
+            first_line = next((ln for ln in data_text.splitlines() if ln.strip()), '')
+            self.n_ports = infer_n_ports(first_line)
+        values = np.array(data_text.split(), dtype=np.float64)
+        out = None
+        if self.n_freq is not None:
+            self._check_n_freq(values.size // record_width(self.n_ports, self.matrix_format))
+            out = (np.empty(self.n_freq, dtype=np.float64),
+                   np.empty((self.n_freq, self.n_ports, self.n_ports), dtype=np.complex128))
+        try:
+            freq, s = unpack_records(values, self.n_ports, self.data_format,
+                                     self.matrix_format, self.two_port_order, out=out)
+        except ValueError as e:
+            raise ValueError(f"无法按 {self.n_ports} 端口解析 {self.file_path}: {e}")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for i in range(len(freq)):
+                logger.debug(f"Parsed line: freq={freq[i]}, S={s[i].ravel()}")
+
         # 频率单位转换到Hz
-        freq = np.array(freq)
-        unit_multiplier = {
-            'HZ': 1,
-            'KHZ': 1e3,
-            'MHZ': 1e6,
-            'GHZ': 1e9
-        }
-        print(f"Detected frequency unit: {self.freq_unit}")
-        if self.freq_unit in unit_multiplier:
-            freq *= unit_multiplier[self.freq_unit]
-        
-        self.freq = freq
-        self.s11 = np.array(s11)
-        self.s12 = np.array(s12)
-        self.s21 = np.array(s21)
-        self.s22 = np.array(s22)
+        logger.debug(f"Detected frequency unit: {self.freq_unit}")
+        if self.freq_unit in FREQ_MUL:
+            freq *= FREQ_MUL[self.freq_unit]
+
+        self._set_arrays(freq, s)
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compile_formula(formula: str):
+    """
+    校验并编译公式，返回 code 对象；同一公式文本只解析、编译一次
+    不允许属性访问和双下划线名称，校验失败或语法错误时抛出 ValueError
+    """
+    try:
+        tree = ast.parse(formula, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"语法错误: {str(e)}")
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Attribute):
+            raise ValueError(f"不允许属性访问: {ast.unparse(node)}")
+        elif isinstance(node, ast.Name) and node.id.startswith('__'):
+            raise ValueError(f"不允许的属性名: {node.id}")
+    return compile(tree, '<formula>', 'eval')
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def formula_names(formula: str) -> frozenset:
+    """公式中引用的全部名称（变量、S 参数、函数），用于建立依赖图"""
+    compile_formula(formula)
+    return frozenset(node.id for node in ast.walk(ast.parse(formula, mode='eval'))
+                     if isinstance(node, ast.Name))
+
+
+# 公共子表达式消除时整体计算、不再拆分的节点（含局部变量，或有短路求值语义）
+_CSE_ATOMIC = (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+               ast.IfExp, ast.BoolOp)
+
+
+def _slice_is_atomic(node) -> bool:
+    """下标中的切片 a:b 或含切片的元组（如 s[:, 1, 0]）不能单独求值，保留在原处"""
+    return isinstance(node, ast.Slice) or (
+        isinstance(node, ast.Tuple) and any(isinstance(e, (ast.Slice, ast.Starred)) for e in node.elts))
+
+
+class _Canonicalizer(ast.NodeTransformer):
+    """
+    可交换运算 (+, *) 的两个操作数按结构排序，使 a*b 与 b*a 得到相同的 AST
+    （复数乘法交换操作数后虚部可能有最后一位的舍入差异）
+    """
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, (ast.Add, ast.Mult)) and ast.dump(node.right) < ast.dump(node.left):
+            node.left, node.right = node.right, node.left
+        return node
+
+
+@functools.lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def _canonical_ast(formula: str):
+    compile_formula(formula)
+    return _Canonicalizer().visit(ast.parse(formula, mode='eval'))
+
+
+def canonical_ast(formula: str) -> ast.Expression:
+    """公式的规范化 AST（副本，可自由修改）"""
+    return copy.deepcopy(_canonical_ast(formula))
+
+
+def _count_ops(node) -> int:
+    """子树中需要计算的节点数（常量和名称不计）"""
+    if isinstance(node, ast.keyword):
+        return _count_ops(node.value)
+    if isinstance(node, (ast.Constant, ast.Name, ast.Slice, ast.Starred)):
+        return 0
+    if isinstance(node, _CSE_ATOMIC):
+        return 1
+    if isinstance(node, ast.Subscript) and _slice_is_atomic(node.slice):
+        return 1 + _count_ops(node.value)
+    return 1 + sum(_count_ops(n) for n in ast.iter_child_nodes(node) if isinstance(n, (ast.expr, ast.keyword)))
 
 
 class xConvFormulaTransformer:
-    """安全地解析和应用文本公式，支持动态注册中间变量"""
+    """
+    安全地解析和应用文本公式，支持动态注册中间变量
+    变量按公式间的依赖关系组成 DAG，只在被用到时按拓扑顺序求值，
+    结果按数据集（s_params 对象）缓存，换数据集时自动清空
+    backend: 'eval' 逐个运算符求值；'fused' 内联变量后按块融合计算（见 xConvFusedEval），
+    不能融合的公式自动回退到 'eval'
+    数据集带有内容哈希（'hash'）时，结果同时写入磁盘缓存（见 xConvResultCache），
+    文件和公式都未改变时直接 memory-map 读取
+    precision: 'export' 全程 complex128/float64；'display' 用于绘图，数据集在绑定时转为
+    complex64/float32（频率网格保持 float64），中间变量和结果也按单精度保存，内存减半
+    """
+
+    BACKENDS = ('eval', 'fused')
+    # 精度策略: 名称 -> (复数类型, 实数类型)
+    PRECISIONS = {'export': (np.complex128, np.float64), 'display': (np.complex64, np.float32)}
 
     # 原有 SAFE_MATH 保持不变
     SAFE_MATH = {
@@ -138,44 +509,295 @@ class xConvFormulaTransformer:
         'j': 1j,
     }
 
-    def __init__(self):
-        self.variables = {}  #  新增：用户注册的中间变量
-        self._formula = {} # 公式来源记录
+    def __init__(self, backend: str = 'eval', use_result_cache: bool = True,
+                 result_cache: xConvResultCache = None, precision: str = 'export'):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"未知的求值后端: {backend}")
+        if precision not in self.PRECISIONS:
+            raise ValueError(f"未知的精度策略: {precision}")
+        self.backend = backend
+        self.precision = precision
+        self.result_cache = (result_cache or xConvResultCache()) if use_result_cache else None
+        self.variables = {}  # 当前数据集上已求值的中间变量
+        self._formula = {}  # 用户注册的中间变量: 名称 -> 公式
+        self._subexpr = {}  # 当前数据集上已求值的公共子表达式: 规范化 AST -> (结果, 子树中的名称)
+        self._dataset = None  # self.variables 所属的数据集
+        self._working = None  # 按精度策略转换后的数据集
 
     # 新增：注册中间变量
-    def register(self, name: str, formula: str, s_params: dict):
-        """注册一个中间变量，供后续公式使用"""
-        value = self.apply_formula(s_params, formula)
-        self.variables[name] = value
+    def register(self, name: str, formula: str, s_params: dict = None):
+        """
+        注册一个中间变量，供后续公式使用（公式在此处校验并编译）
+        变量不会立即求值，而是在第一次被公式用到时计算
+        """
+        try:
+            compile_formula(formula)
+        except ValueError as e:
+            raise ValueError(f"公式解析错误 '{formula}': {str(e)}")
         self._formula[name] = formula  # 记录公式来源
+        # 该变量及依赖它的变量已求值的结果过期
+        self._invalidate(self._downstream({name}))
+        if s_params is not None:
+            self._bind(s_params)
         print(f"已注册变量: {name}")
 
     # 新增：列出变量
     def list_variables(self):
         print("当前已注册变量:")
-        for name in self.variables:
-            print(f"  {name}")
+        for name, formula in self._formula.items():
+            print(f"  {name} = {formula}")
 
     # 新增：清除变量
     def clear_variables(self):
-        self.variables.clear()
+        self._formula.clear()
+        self._invalidate()
         print("已清除所有用户变量")
 
     # 修改：apply_formula 现在支持使用已注册变量
     def apply_formula(self, s_params: dict, formula: str) -> np.ndarray:
-        namespace = self.create_safe_namespace(s_params)
-        namespace.update(self.variables)  # 加入用户变量
-
+        s_params = self._bind(s_params)
         try:
-            result = eval(formula, {"__builtins__": {}}, namespace)
-            if isinstance(result, (int, float, complex, np.number)):
-                return np.full_like(s_params['freq'], result, dtype=complex)
-            elif isinstance(result, (list, tuple)):
-                return np.array(result, dtype=complex)
-            return result
+            key = self._result_key(s_params, formula)
+            cached = self._load_result(key)
+            if cached is not None:
+                return cached
+            if self.backend == 'fused':
+                try:
+                    return self._store_result(key, self._apply_fused(s_params, formula))
+                except Unfusable as e:
+                    logger.debug(f"'{formula}' 无法融合计算，回退到 eval: {e}")
+            return self._store_result(key, self._apply_eval(s_params, formula))
         except Exception as e:
             raise ValueError(f"公式解析错误 '{formula}': {str(e)}")
 
+    # ---------- 结果磁盘缓存 ----------
+    def _result_key(self, s_params: dict, formula: str):
+        """数据集没有内容哈希或未启用缓存时返回 None"""
+        if self.result_cache is None or not s_params.get('hash'):
+            return None
+        definitions = {name: self._formula[name] for name in self._resolve(formula_names(formula))}
+        return result_key(s_params['hash'], ast.dump(_canonical_ast(formula)), definitions,
+                          precision=self.precision)
+
+    def _load_result(self, key):
+        if key is None:
+            return None
+        try:
+            return self.result_cache.load(key)
+        except OSError as e:
+            logger.warning(f"读取结果缓存失败: {e}")
+            return None
+
+    def _store_result(self, key, value):
+        if key is not None and isinstance(value, np.ndarray):
+            try:
+                self.result_cache.store(key, value)
+            except OSError as e:
+                logger.warning(f"写入结果缓存失败: {e}")
+        return value
+
+    def _apply_eval(self, s_params: dict, formula: str):
+        # 使用缓存的 code 对象，重复刷新时不再解析公式
+        code = compile_formula(formula)
+        # 只计算公式实际用到的变量
+        for name in self._resolve(formula_names(formula)):
+            if name not in self.variables:
+                self.variables[name] = self._evaluate(compile_formula(self._formula[name]), s_params)
+        return self._evaluate(code, s_params)
+
+    def _apply_fused(self, s_params: dict, formula: str):
+        compile_formula(formula)
+        # 用到的变量定义内联进计划，计划按 (公式, 定义) 缓存
+        definitions = tuple((name, self._formula[name]) for name in self._resolve(formula_names(formula)))
+        plan = compile_plan(formula, definitions)
+        return self._finish(plan.run(self.create_safe_namespace(s_params)), s_params)
+
+    def check_backend(self, s_params: dict, formula: str, rtol: float = 1e-12) -> Tuple[bool, float]:
+        """
+        用 eval 路径校验融合后端的结果
+        返回 (是否一致, 最大绝对误差)；公式无法融合时两者都走 eval，结果必然一致
+        """
+        s_params = self._bind(s_params)
+        ref = np.asarray(self._apply_eval(s_params, formula))
+        try:
+            fused = np.asarray(self._apply_fused(s_params, formula))
+        except Unfusable:
+            return True, 0.0
+        if fused.shape != ref.shape:
+            return False, float('inf')
+        ok = np.allclose(fused, ref, rtol=rtol, atol=0, equal_nan=True)
+        finite = np.isfinite(ref) & np.isfinite(fused)
+        err = float(np.max(np.abs(fused[finite] - ref[finite]), initial=0.0))
+        return bool(ok), err
+
+    def evaluate_batch(self, s_params: dict, formulas: List[str]) -> Tuple[List[np.ndarray], Dict[str, int]]:
+        """
+        批量计算多个公式，消除公共子表达式
+        各公式的 AST 先规范化（可交换运算的操作数排序），结构相同的子树在同一数据集上只计算一次，
+        如 abs(z11)、20*log10(abs(z11))、phase(z11)*180/pi 共用 z11 和 abs(z11)
+        返回 (结果列表, 统计)，统计为 {'total': 逐个计算所需的运算次数, 'evaluated': 实际计算次数,
+        'saved': 公共子表达式节省的次数, 'cache_hits': 直接取自结果缓存的公式数}；缓存命中的公式不计入前三项
+        """
+        s_params = self._bind(s_params)
+        stats = {'total': 0, 'evaluated': 0, 'saved': 0, 'cache_hits': 0}
+        results = []
+        for formula in formulas:
+            try:
+                compile_formula(formula)
+                tree = canonical_ast(formula)
+                key = self._result_key(s_params, formula)
+                cached = self._load_result(key)
+                if cached is not None:
+                    stats['cache_hits'] += 1
+                    results.append(cached)
+                    continue
+                stats['total'] += _count_ops(tree.body)
+                for name in self._resolve(formula_names(formula)):
+                    if name not in self.variables:
+                        self.variables[name] = self._evaluate(compile_formula(self._formula[name]), s_params)
+                namespace = self.create_safe_namespace(s_params)
+                namespace.update(self.variables)
+                value = self._finish(self._eval_node(tree.body, namespace, stats), s_params)
+                results.append(self._store_result(key, value))
+            except Exception as e:
+                raise ValueError(f"公式解析错误 '{formula}': {str(e)}")
+        stats['saved'] = stats['total'] - stats['evaluated']
+        logger.debug(f"evaluate_batch: {len(formulas)} formulas, {stats}")
+        return results, stats
+
+    def _eval_node(self, node, namespace: dict, stats: dict):
+        """自底向上计算子树，结果按规范化 AST 缓存在 self._subexpr"""
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id not in namespace:
+                raise NameError(f"name '{node.id}' is not defined")
+            return namespace[node.id]
+        key = ast.dump(node)
+        if key in self._subexpr:
+            return self._subexpr[key][0]
+        if isinstance(node, _CSE_ATOMIC):
+            # lambda / 推导式内部有局部变量，整体计算
+            value = eval(compile(ast.Expression(node), '<formula>', 'eval'), {"__builtins__": {}}, namespace)
+        else:
+            # 子节点先求值，本节点替换为临时变量后再编译计算
+            local = dict(namespace)
+            def child(sub):
+                if isinstance(sub, (ast.Constant, ast.Name, ast.Slice, ast.Starred)):
+                    return sub
+                tmp = f'_cse{len(local)}'
+                local[tmp] = self._eval_node(sub, namespace, stats)
+                return ast.Name(id=tmp, ctx=ast.Load())
+            shallow = copy.copy(node)
+            for field, val in ast.iter_fields(node):
+                if isinstance(node, ast.Subscript) and field == 'slice' and _slice_is_atomic(val):
+                    continue
+                if isinstance(val, ast.expr):
+                    setattr(shallow, field, child(val))
+                elif isinstance(val, list):
+                    setattr(shallow, field, [child(v) if isinstance(v, ast.expr)
+                                             else ast.keyword(arg=v.arg, value=child(v.value)) if isinstance(v, ast.keyword)
+                                             else v for v in val])
+            # 临时表达式各不相同，不经过 compile_formula 的 LRU 缓存，以免挤掉用户公式
+            # （原公式已整体校验过，子树无需再校验）
+            code = compile(ast.fix_missing_locations(ast.Expression(shallow)), '<formula>', 'eval')
+            value = eval(code, {"__builtins__": {}}, local)
+        stats['evaluated'] += 1
+        self._subexpr[key] = (value, frozenset(n.id for n in ast.walk(node) if isinstance(n, ast.Name)))
+        return value
+
+    def _finish(self, result, s_params: dict):
+        """
+        标量结果扩展为与频率等长的数组；堆叠数据集上扩展为 (文件数, 点数)
+        浮点结果按精度策略转换类型
+        """
+        cplx, real = self.PRECISIONS[self.precision]
+        if 'n_files' in s_params:
+            shape = (s_params['n_files'], len(s_params['freq']))
+            if isinstance(result, (int, float, complex, np.number)):
+                return np.full(shape, result, dtype=cplx)
+            if isinstance(result, np.ndarray) and result.ndim < 2:
+                # 只与频率有关的结果（如 2*pi*freq）对每个文件相同
+                return np.broadcast_to(self._cast(result), shape)
+        if isinstance(result, (int, float, complex, np.number)):
+            return np.full_like(s_params['freq'], result, dtype=cplx)
+        elif isinstance(result, (list, tuple)):
+            return np.array(result, dtype=cplx)
+        return self._cast(result)
+
+    def _cast(self, value):
+        cplx, real = self.PRECISIONS[self.precision]
+        if isinstance(value, np.ndarray):
+            if np.issubdtype(value.dtype, np.complexfloating):
+                return value.astype(cplx, copy=False)
+            if np.issubdtype(value.dtype, np.floating):
+                return value.astype(real, copy=False)
+        return value
+
+    def _invalidate(self, names: set = None):
+        """清空已求值的变量和子表达式；给出 names 时只清除这些变量以及引用它们的子表达式"""
+        if names is None:
+            self.variables.clear()
+            self._subexpr.clear()
+            return
+        for name in names:
+            self.variables.pop(name, None)
+        self._subexpr = {k: v for k, v in self._subexpr.items() if not (v[1] & names)}
+
+    def _downstream(self, names: set, known: set = None) -> set:
+        """names 以及直接或间接依赖它们的全部变量（按反向依赖图遍历）"""
+        known = set(self._formula) | set(known or ())
+        dependents = {}
+        for name, formula in self._formula.items():
+            for dep in formula_names(formula) & known:
+                dependents.setdefault(dep, set()).add(name)
+        result = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in result:
+                result.add(name)
+                stack.extend(dependents.get(name, ()))
+        return result
+
+    def affected(self, formula: str, invalidated: set) -> bool:
+        """公式的结果是否受 invalidated 中变量的影响（invalidated 已包含下游变量）"""
+        return bool(formula_names(formula) & invalidated)
+
+    def _bind(self, s_params: dict) -> dict:
+        """切换数据集时清空已求值的变量，返回按精度策略转换后的数据集"""
+        if s_params is not self._dataset:
+            self._invalidate()
+            self._dataset = s_params
+            self._working = cast_dataset(s_params, *self.PRECISIONS[self.precision])
+        return self._working
+
+    def _resolve(self, names) -> List[str]:
+        """返回 names 直接或间接依赖的用户变量，按拓扑顺序（被依赖者在前）；存在循环依赖时抛出 ValueError"""
+        order = []
+        state = {}  # 1: 正在访问, 2: 已完成
+        def visit(name, path):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                cycle = path[path.index(name):] + [name]
+                raise ValueError(f"变量存在循环依赖: {' -> '.join(cycle)}")
+            state[name] = 1
+            for dep in sorted(formula_names(self._formula[name])):
+                if dep in self._formula:
+                    visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+        for name in sorted(names):
+            if name in self._formula:
+                visit(name, [])
+        return order
+
+    def _evaluate(self, code, s_params: dict):
+        namespace = self.create_safe_namespace(s_params)
+        namespace.update(self.variables)  # 加入用户变量
+        return self._finish(eval(code, {"__builtins__": {}}, namespace), s_params)
+
     # 原有方法不变，仅内部调用
     @staticmethod
     def create_safe_namespace(s_params: dict) -> dict:
@@ -189,44 +811,213 @@ class xConvFormulaTransformer:
         namespace['zeros_like'] = np.zeros_like
         return namespace
 
-    #  原有方法不变
     @staticmethod
     def validate_formula(formula: str) -> Tuple[bool, str]:
         try:
-            compiled = compile(formula, '<string>', 'eval')
-            import ast
-            tree = ast.parse(formula, mode='eval')
-            for node in ast.walk(tree):
-                if isinstance(node, ast.Attribute):
-                    return False, f"不允许属性访问: {ast.unparse(node)}"
-                elif isinstance(node, ast.Name) and node.id.startswith('__'):
-                    return False, f"不允许的属性名: {node.id}"
+            compile_formula(formula)
             return True, ""
-        except SyntaxError as e:
-            return False, f"语法错误: {str(e)}"
+        except ValueError as e:
+            return False, str(e)
     # ----------- 1. 保存公式定义 -----------
     def save_formulas(self, path: str = "xConv\\xConvFormulaDef.json"):
         """把当前用户变量的【公式】保存为 json 文件（不含计算结果）"""
         # 只保存 name:formula 映射
-        formula_dict = {name: self._formula.get(name, "") for name in self.variables}
+        formula_dict = dict(self._formula)
         with open(path, "w", encoding="utf-8") as f:
             json.dump(formula_dict, f, indent=2, ensure_ascii=False)
         print(f"公式定义已保存到 {path}")
 
     # ----------- 2. 加载公式定义 -----------
-    def load_formulas(self, s_params: dict, path: str = "xConv\\xConvFormulaDef.json"):
-        """从 json 文件读取公式并重新注册（需提供 s_params）"""
+    def load_formulas(self, s_params: dict = None, path: str = "xConv\\xConvFormulaDef.json"):
+        """
+        从 json 文件读取公式并与当前定义比较，只让变化的变量及其下游失效
+        变量在被用到时才求值，定义顺序不限；返回失效的变量名集合
+        """
+        formula_dict = self.read_formula_file(path)
+        if formula_dict is None:
+            return set()
+        if s_params is not None:
+            self._bind(s_params)
+        invalidated = self.define(formula_dict)
+        print(f"公式定义已加载自 {path}，需要重新计算的变量: {sorted(invalidated)}")
+        return invalidated
+
+    @staticmethod
+    def read_formula_file(path: str = "xConv\\xConvFormulaDef.json"):
+        """读取公式定义文件，返回 {名称: 公式}；文件不存在时返回 None"""
         if not os.path.isfile(path):
             print(f"文件不存在，跳过加载: {path}")
-            return
+            return None
         with open(path, "r", encoding="utf-8") as f:
-            formula_dict = json.load(f)
-        # 先清空旧变量
-        self.variables.clear()
-        self._formula = {}          # 新增：记录公式源码
-        for name, formula in formula_dict.items():
-            self.register(name, formula, s_params)
-        print(f"公式定义已加载自 {path}")
+            return json.load(f)
+
+    def define(self, formulas: Dict[str, str]) -> set:
+        """
+        一次性替换全部变量定义（不逐个打印），与当前定义逐项比较
+        只清除新增、删除、修改的变量及其下游变量的结果，返回这些变量名，
+        界面可据此只刷新受影响的曲线（见 affected）
+        """
+        for name, formula in formulas.items():
+            try:
+                compile_formula(formula)
+            except ValueError as e:
+                raise ValueError(f"变量 {name} 公式解析错误 '{formula}': {str(e)}")
+        old = self._formula
+        changed = {name for name in set(old) | set(formulas) if old.get(name) != formulas.get(name)}
+        self._formula = dict(formulas)
+        invalidated = self._downstream(changed, known=set(old))
+        self._invalidate(invalidated)
+        return invalidated
+
+
+def sparam_dataset(freq, s, z0=50.0) -> Dict[str, Any]:
+    """
+    由内存中的频率和 (点数, N, N) S 参数数组构造与 xConvS2PReader.read() 相同格式的数据集
+    用于驱动直接交给界面的测量结果；没有内容哈希，不写入结果缓存
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    s = np.asarray(s, dtype=np.complex128)
+    if s.ndim != 3 or s.shape[1] != s.shape[2] or s.shape[0] != len(freq):
+        raise ValueError(f"S 参数形状 {s.shape} 与 {len(freq)} 个频率点不匹配")
+    n_ports = s.shape[1]
+    z0_ports = np.broadcast_to(np.asarray(z0, dtype=np.float64), (n_ports,)).copy()
+    result = {'freq': freq}
+    for name, i, j in sparam_names(n_ports):
+        result[name] = s[:, i, j]
+    result['s'] = s
+    result['n_ports'] = n_ports
+    result['z0'] = float(z0_ports[0])
+    result['z0_ports'] = z0_ports
+    result['hash'] = None
+    return result
+
+
+# 频率网格和参考阻抗不随精度策略转换，始终保持 float64（单精度下 2.4 GHz 附近相邻值相差 256 Hz）
+GRID_KEYS = ('freq', 'z0_ports')
+
+
+def cast_dataset(s_params: Dict[str, Any], cplx=np.complex128, real=np.float64) -> Dict[str, Any]:
+    """
+    按给定的复数/实数类型转换数据集中的数组（GRID_KEYS 除外），类型已一致时原样返回
+    's' 只转换一次，sij 重新取为它的视图
+    """
+    arrays = [v for key, v in s_params.items() if isinstance(v, np.ndarray) and key not in GRID_KEYS]
+    if all(v.dtype in (np.dtype(cplx), np.dtype(real)) or not np.issubdtype(v.dtype, np.inexact)
+           for v in arrays):
+        return s_params
+    def cast(v):
+        if not isinstance(v, np.ndarray):
+            return v
+        if np.issubdtype(v.dtype, np.complexfloating):
+            return v.astype(cplx)
+        if np.issubdtype(v.dtype, np.floating):
+            return v.astype(real)
+        return v
+    result = {key: v if key in GRID_KEYS else cast(v) for key, v in s_params.items() if key != 's'}
+    if isinstance(s_params.get('s'), np.ndarray):
+        s = s_params['s'].astype(cplx)
+        for name, i, j in sparam_names(s_params['n_ports']):
+            if name in s_params:
+                result[name] = s[..., i, j]
+        result['s'] = s
+    return result
+
+
+def stack_datasets(datasets: List[Dict[str, Any]], freq: np.ndarray = None,
+                   dtype=np.complex128) -> Dict[str, Any]:
+    """
+    把多个同端口数的数据集堆叠到同一频率网格上，可直接传给 xConvFormulaTransformer 一次算完
+    freq 为空时: 各文件频率点完全相同则直接使用，否则取第一个文件在公共频率范围内的点
+    频率点不同的文件按实部/虚部线性插值（与 np.interp 相同）
+    dtype 为堆叠后 S 参数的类型，绘图时可用 complex64 减少内存
+    返回 {'freq': (点数,), 'sij': (文件数, 点数), 's': (文件数, 点数, N, N), 'n_ports': int,
+          'n_files': int, 'z0': float, 'z0_ports': (文件数, N)}
+    """
+    if not datasets:
+        raise ValueError("没有可堆叠的数据集")
+    n_ports = datasets[0]['n_ports']
+    for d in datasets:
+        if d['n_ports'] != n_ports:
+            raise ValueError(f"端口数不一致: {n_ports} 和 {d['n_ports']}")
+    if freq is None:
+        freq = np.asarray(datasets[0]['freq'])
+        if not all(np.array_equal(d['freq'], freq) for d in datasets[1:]):
+            lo = max(d['freq'][0] for d in datasets)
+            hi = min(d['freq'][-1] for d in datasets)
+            if lo > hi:
+                raise ValueError("各文件的频率范围没有重叠")
+            freq = freq[(freq >= lo) & (freq <= hi)]
+    freq = np.array(freq, dtype=np.float64)
+
+    s = np.empty((len(datasets), len(freq), n_ports, n_ports), dtype=dtype)
+    for k, d in enumerate(datasets):
+        f = np.asarray(d['freq'])
+        if np.array_equal(f, freq):
+            s[k] = d['s']
+            continue
+        if freq[0] < f[0] or freq[-1] > f[-1]:
+            raise ValueError(f"频率网格超出第 {k + 1} 个文件的频率范围")
+        # 所有 S 参数共用同一组插值下标和权重
+        idx = np.clip(np.searchsorted(f, freq), 1, len(f) - 1)
+        w = ((freq - f[idx - 1]) / (f[idx] - f[idx - 1]))[:, None, None]
+        s[k] = d['s'][idx - 1] * (1 - w) + d['s'][idx] * w
+
+    result = {'freq': freq}
+    for name, i, j in sparam_names(n_ports):
+        result[name] = s[:, :, i, j]
+    result['s'] = s
+    result['n_ports'] = n_ports
+    result['n_files'] = len(datasets)
+    result['z0'] = datasets[0]['z0']
+    result['z0_ports'] = np.array([d.get('z0_ports', np.full(n_ports, d['z0'])) for d in datasets])
+    if all(d.get('hash') for d in datasets):
+        # 堆叠结果由各文件内容、频率网格和 S 参数类型唯一决定；
+        # complex64 堆叠已经舍入，不能与 complex128 堆叠共用结果缓存
+        h = hashlib.sha1(b'stack')
+        for d in datasets:
+            h.update(d['hash'].encode('ascii'))
+        h.update(freq.tobytes())
+        h.update(np.dtype(dtype).str.encode('ascii'))
+        result['hash'] = h.hexdigest()
+    return result
+
+
+def read_stack(file_paths: List[str], freq: np.ndarray = None, dtype=np.complex128) -> Dict[str, Any]:
+    """读取一组 sNp 文件并堆叠，结果中 'files' 为对应的文件路径"""
+    result = stack_datasets([xConvS2PReader(p).read() for p in file_paths], freq, dtype)
+    result['files'] = list(file_paths)
+    return result
+
+
+class xConvEvalContext:
+    """
+    单个数据集的求值上下文: 文件数据 + 已求值的中间变量 + 编译后的表达式
+    同一次刷新中引用同一文件的所有曲线共用一个上下文，文件只读一次，变量只算一次
+    """
+
+    def __init__(self, s_params: dict, formulas: Dict[str, str] = None, backend: str = 'eval',
+                 precision: str = 'export'):
+        self.transformer = xConvFormulaTransformer(backend, precision=precision)
+        # 只保留按精度策略转换后的数据，display 模式下不再持有双精度副本
+        self.s_params = cast_dataset(s_params, *xConvFormulaTransformer.PRECISIONS[precision])
+        self.transformer.define(formulas or {})
+
+    @classmethod
+    def from_file(cls, file_path: str, formulas: Dict[str, str] = None, backend: str = 'eval',
+                  precision: str = 'export'):
+        return cls(xConvS2PReader(file_path).read(), formulas, backend, precision)
+
+    @property
+    def freq(self) -> np.ndarray:
+        return self.s_params['freq']
+
+    def evaluate(self, formula: str) -> np.ndarray:
+        """在本数据集上计算公式，中间变量在上下文内缓存"""
+        return self.transformer.apply_formula(self.s_params, formula)
+
+    def evaluate_batch(self, formulas: List[str]):
+        """批量计算，公共子表达式只算一次，返回 (结果列表, 统计)"""
+        return self.transformer.evaluate_batch(self.s_params, formulas)
 
 
 # 使用示例
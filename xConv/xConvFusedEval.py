@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xConvFusedEval.py
+公式的融合、分块求值后端
+1. 把公式及其依赖的中间变量定义内联成一棵表达式树，常量提前折叠；
+2. 表达式树编译为一串带 out= 的 NumPy ufunc 操作，按 BLOCK_SIZE 个点分块执行，
+   中间结果写入可复用的临时缓冲区（按活跃区间回收），最后一步直接写入结果数组；
+3. 各临时量的 dtype 由首个数据点上的试运行确定；
+4. 安装了 numexpr 时优先交给 numexpr 计算（试运行结果与 NumPy 计划一致才启用）；
+5. 表达式中含有非逐点函数（unwrap、max、where、下标等）时抛出 Unfusable，由调用方回退到 eval。
+"""
+import ast
+import copy
+import functools
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:     # numexpr 为可选依赖
+    numexpr = None
+
+BLOCK_SIZE = 4096   # 每块点数，complex128 时单个缓冲区 64 KB
+PLAN_CACHE_SIZE = 256
+
+
+class Unfusable(Exception):
+    """表达式无法编译为融合计划"""
+
+
+# ---------- 逐点函数（与 ufunc 一样接受 out=，out 为 None 时分配新数组） ----------
+def _real(x, out=None):
+    if out is None:
+        return np.real(x).copy()
+    np.copyto(out, np.real(x))
+    return out
+
+
+def _imag(x, out=None):
+    if out is None:
+        return np.imag(x).copy()
+    np.copyto(out, np.imag(x))
+    return out
+
+
+def _angle(x, out=None):
+    return np.arctan2(np.imag(x), np.real(x), out=out)
+
+
+def _db(x, out=None):
+    out = np.absolute(x, out=out)
+    np.maximum(out, 1e-15, out=out)
+    np.log10(out, out=out)
+    return np.multiply(out, 20, out=out)
+
+
+# 公式中的函数名 -> 支持 out= 的逐点函数，与 xConvFormulaTransformer.SAFE_MATH 对应
+FUNCS = {
+    'abs': np.absolute, 'mag': np.absolute, 'sqrt': np.sqrt, 'exp': np.exp, 'log': np.log,
+    'log10': np.log10, 'sin': np.sin, 'cos': np.cos, 'tan': np.tan, 'asin': np.arcsin,
+    'acos': np.arccos, 'atan': np.arctan, 'atan2': np.arctan2, 'sinh': np.sinh,
+    'cosh': np.cosh, 'tanh': np.tanh, 'degrees': np.degrees, 'radians': np.radians,
+    'pow': np.power, 'conj': np.conjugate, 'real': _real, 'imag': _imag,
+    'phase': _angle, 'angle': _angle, 'db': _db,
+}
+# 常量折叠时使用的标量版本
+SCALAR_FUNCS = {
+    'real': np.real, 'imag': np.imag, 'phase': np.angle, 'angle': np.angle,
+    'db': lambda x: 20 * np.log10(np.maximum(np.abs(x), 1e-15)),
+}
+CONSTANTS = {'pi': np.pi, 'e': np.e, 'j': 1j}
+BINOPS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.Pow: np.power, ast.FloorDiv: np.floor_divide, ast.Mod: np.remainder,
+}
+UNARYOPS = {ast.USub: np.negative, ast.UAdd: np.positive}
+# numexpr 支持的函数（公式名 -> numexpr 名）；abs、phase 等语义不同的函数不交给 numexpr
+NUMEXPR_FUNCS = {
+    'sqrt': 'sqrt', 'exp': 'exp', 'log': 'log', 'log10': 'log10', 'sin': 'sin', 'cos': 'cos',
+    'tan': 'tan', 'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan', 'atan2': 'arctan2',
+    'sinh': 'sinh', 'cosh': 'cosh', 'tanh': 'tanh', 'real': 'real', 'imag': 'imag', 'conj': 'conj',
+}
+
+
+class xConvFusedPlan:
+    """
+    编译后的融合计划
+    ops 为 (函数, 操作数列表, 输出临时量编号)，操作数为 ('const', 值) / ('array', 名称) / ('tmp', 编号)
+    """
+
+    def __init__(self, formula: str, ops, result, arrays, ne_expr: str = None):
+        self.formula = formula
+        self.ops = ops
+        self.result = result        # 最终结果的操作数
+        self.arrays = arrays        # 用到的数据数组名称
+        self.ne_expr = ne_expr      # numexpr 表达式，None 表示不可用
+        self.use_numexpr = numexpr is not None and ne_expr is not None
+        self._numexpr_dtypes = {}   # 结果类型 -> numexpr 结果类型是否与之一致
+
+    def _inputs(self, namespace: dict):
+        arrays = {}
+        n = None
+        for name in self.arrays:
+            if name not in namespace:
+                raise NameError(f"name '{name}' is not defined")
+            arr = namespace[name]
+            if not isinstance(arr, np.ndarray) or arr.ndim != 1 or (n is not None and arr.size != n):
+                raise Unfusable(f"'{name}' 不是等长的一维数组")
+            n = arr.size
+            arrays[name] = arr
+        return arrays, n
+
+    @staticmethod
+    def _value(operand, arrays, tmps, lo, hi):
+        kind, v = operand
+        if kind == 'const':
+            return v
+        if kind == 'array':
+            return arrays[v][lo:hi]
+        return tmps[v][:hi - lo]
+
+    def _dry_run(self, arrays):
+        """在首个数据点上逐步执行，得到每个临时量的 dtype"""
+        tmps = {}
+        with np.errstate(all='ignore'):
+            for func, args, out in self.ops:
+                vals = [self._value(a, arrays, tmps, 0, 1) for a in args]
+                tmps[out] = np.asarray(func(*vals))
+        return {k: v.dtype for k, v in tmps.items()}
+
+    def run(self, namespace: dict):
+        """在 namespace 提供的数组上执行计划，返回结果（常量结果原样返回，由调用方扩展）"""
+        arrays, n = self._inputs(namespace)
+        if self.result[0] == 'const':
+            return self.result[1]
+        if self.result[0] == 'array':
+            return arrays[self.result[1]]
+        if n is None:
+            raise Unfusable('表达式中没有数据数组')
+        dtypes = self._dry_run(arrays)
+        final_dtype = dtypes[self.result[1]]
+        if self.use_numexpr and self._numexpr_dtypes.get(final_dtype, True):
+            out = numexpr.evaluate(self.ne_expr, local_dict=arrays)
+            if out.dtype == final_dtype:
+                self._numexpr_dtypes[final_dtype] = True
+                return out
+            # 类型与 NumPy 计划不一致（如单精度输入），该类型以后不再使用 numexpr
+            self._numexpr_dtypes[final_dtype] = False
+
+        # 为临时量分配缓冲区: 同 dtype 的缓冲区在不再被引用后复用
+        last_use = {}
+        for k, (_, args, _) in enumerate(self.ops):
+            for kind, v in args:
+                if kind == 'tmp':
+                    last_use[v] = k
+        final = self.result[1]
+        result = np.empty(n, dtype=dtypes[final])
+        size = min(n, BLOCK_SIZE)
+        free = {}
+        buffers = {}
+        for k, (_, args, out) in enumerate(self.ops):
+            if out != final:
+                pool = free.setdefault(dtypes[out], [])
+                buffers[out] = pool.pop() if pool else np.empty(size, dtype=dtypes[out])
+            for kind, v in args:
+                if kind == 'tmp' and last_use[v] == k and v != final:
+                    free.setdefault(dtypes[v], []).append(buffers[v])
+
+        for lo in range(0, n, BLOCK_SIZE):
+            hi = min(lo + BLOCK_SIZE, n)
+            views = {t: b[:hi - lo] for t, b in buffers.items()}
+            views[final] = result[lo:hi]
+            for func, args, out in self.ops:
+                vals = [self._value(a, arrays, views, lo, hi) for a in args]
+                func(*vals, out=views[out])
+        return result
+
+
+class _Compiler:
+    """把内联后的表达式树编译为操作序列"""
+
+    def __init__(self, definitions: dict):
+        self.definitions = definitions
+        self.ops = []
+        self.arrays = []
+        self.n_tmp = 0
+        self.emitted = {}   # 已内联的变量，多次引用时只计算一次
+
+    def emit(self, node):
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float, complex)) or isinstance(node.value, bool):
+                raise Unfusable(f'不支持的常量 {node.value!r}')
+            return 'const', node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.definitions:
+                if node.id not in self.emitted:
+                    operand = self.emit(self.definitions[node.id])
+                    # eval 路径中标量变量被扩展为复数数组，这里保持相同的类型
+                    if operand[0] == 'const':
+                        operand = 'const', complex(operand[1])
+                    self.emitted[node.id] = operand
+                return self.emitted[node.id]
+            if node.id in CONSTANTS:
+                return 'const', CONSTANTS[node.id]
+            if node.id in FUNCS:
+                raise Unfusable(f'函数 {node.id} 不能作为数值使用')
+            if node.id not in self.arrays:
+                self.arrays.append(node.id)
+            return 'array', node.id
+        if isinstance(node, ast.BinOp) and type(node.op) in BINOPS:
+            return self.op(BINOPS[type(node.op)], [node.left, node.right])
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARYOPS:
+            return self.op(UNARYOPS[type(node.op)], [node.operand])
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords
+                and node.func.id in FUNCS and node.func.id not in self.definitions):
+            return self.op(FUNCS[node.func.id], node.args, SCALAR_FUNCS.get(node.func.id))
+        raise Unfusable(f'不支持的表达式 {ast.unparse(node)}')
+
+    def op(self, func, arg_nodes, scalar_func=None):
+        args = [self.emit(a) for a in arg_nodes]
+        if all(kind == 'const' for kind, _ in args):
+            # 常量折叠
+            value = (scalar_func or func)(*[v for _, v in args])
+            return 'const', value.item() if isinstance(value, np.generic) else value
+        out = self.n_tmp
+        self.n_tmp += 1
+        self.ops.append((func, args, out))
+        return 'tmp', out
+
+
+class _NumexprWriter(ast.NodeTransformer):
+    """内联后的表达式树 -> numexpr 表达式；遇到 numexpr 不支持的节点抛出 Unfusable"""
+
+    def __init__(self, definitions: dict, emitted: dict):
+        self.definitions = definitions
+        self.emitted = emitted
+
+    def visit_Name(self, node):
+        if node.id in self.definitions:
+            kind, value = self.emitted[node.id]
+            if kind == 'const':
+                return ast.Constant(value)
+            return self.visit(copy.deepcopy(self.definitions[node.id]))
+        if node.id in CONSTANTS:
+            return ast.Constant(CONSTANTS[node.id])
+        return node
+
+    def visit_Call(self, node):
+        if (not isinstance(node.func, ast.Name) or node.keywords or node.func.id in self.definitions
+                or node.func.id not in NUMEXPR_FUNCS):
+            raise Unfusable('numexpr 不支持该函数')
+        node.args = [self.visit(a) for a in node.args]
+        node.func = ast.Name(id=NUMEXPR_FUNCS[node.func.id], ctx=ast.Load())
+        return node
+
+    def generic_visit(self, node):
+        if not isinstance(node, (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+                                 ast.operator, ast.unaryop, ast.expr_context)):
+            raise Unfusable('numexpr 不支持该表达式')
+        return super().generic_visit(node)
+
+
+@functools.lru_cache(maxsize=PLAN_CACHE_SIZE)
+def compile_plan(formula: str, definitions: tuple = ()) -> xConvFusedPlan:
+    """
+    编译融合计划，按 (公式, 用到的变量定义) 缓存
+    definitions 为 ((名称, 公式), ...)，须已按依赖关系检查过循环
+    """
+    defs = {name: ast.parse(f, mode='eval').body for name, f in definitions}
+    tree = ast.parse(formula, mode='eval')
+    comp = _Compiler(defs)
+    result = comp.emit(tree.body)
+    ne_expr = None
+    if numexpr is not None and comp.ops:
+        try:
+            ne_expr = ast.unparse(_NumexprWriter(defs, comp.emitted).visit(tree))
+        except Unfusable:
+            ne_expr = None
+    return xConvFusedPlan(formula, comp.ops, result, comp.arrays, ne_expr)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xConvResultCache.py
+公式计算结果的磁盘缓存（按内容寻址）
+1. 键由 数据集内容哈希 + 规范化后的公式 AST + 用到的变量定义 决定，文件或公式不变时结果永远有效；
+2. 每个结果保存为 <键>.npy（原始 .npy，读取时 memory-map）；
+3. 命中时刷新文件 mtime，总大小超过上限时按 mtime 从旧到新删除（LRU）；
+   总大小在内存中累计估算，只在估算值超过上限时才扫描目录，并一次淘汰到上限的 EVICT_TO；
+4. 命令行: python xConvResultCache.py list|clear [--cache-dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+RESULT_CACHE_VERSION = 1
+# 默认缓存目录，可用环境变量 XFRA_RESULT_CACHE 覆盖
+DEFAULT_CACHE_DIR = os.environ.get(
+    'XFRA_RESULT_CACHE', os.path.join(os.path.expanduser('~'), '.xFRA', 'result_cache'))
+DEFAULT_MAX_BYTES = 256 << 20
+# 超过上限时一次淘汰到上限的这一比例，避免达到上限后每次写入都扫描目录
+EVICT_TO = 0.9
+
+
+def result_key(dataset_hash: str, formula_ast: str, definitions: dict, **extra) -> str:
+    """
+    结果缓存键
+    formula_ast 为规范化 AST 的 ast.dump，definitions 为公式实际用到的 {变量名: 公式}
+    extra 为其余影响结果的设置（如精度）
+    """
+    h = hashlib.sha1()
+    h.update(f'v{RESULT_CACHE_VERSION}\0{dataset_hash}\0{formula_ast}\0'.encode('utf-8'))
+    h.update(json.dumps(definitions, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    h.update(json.dumps(extra, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class xConvResultCache:
+    """公式结果缓存，总大小不超过 max_bytes"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._total = None  # 缓存目录总大小的估算值，首次写入时扫描一次，淘汰时按实际大小校正
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def load(self, key: str):
+        """命中时返回只读 memory-map 数组，未命中返回 None"""
+        path = self._path(key)
+        try:
+            arr = np.load(path, mmap_mode='r')
+            os.utime(path)  # 记录最近使用时间
+        except (OSError, ValueError):
+            return None
+        return arr
+
+    def store(self, key: str, value: np.ndarray):
+        """写入结果并按上限淘汰；object 数组等无法 memory-map 的结果不缓存"""
+        value = np.asarray(value)
+        if value.dtype.hasobject or value.nbytes > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self.entries())
+        path = self._path(key)
+        try:
+            self._total -= os.path.getsize(path)   # 覆盖已有结果
+        except OSError:
+            pass
+        tmp = os.path.join(self.cache_dir, f'{key}.{os.getpid()}.tmp.npy')
+        np.save(tmp, np.ascontiguousarray(value))
+        self._total += os.path.getsize(tmp)
+        os.replace(tmp, path)
+        if self._total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+
+    def entries(self):
+        """[(路径, 大小, mtime)]，按 mtime 从旧到新"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        items = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy') or name.endswith('.tmp.npy'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            items.append((path, st.st_size, st.st_mtime))
+        return sorted(items, key=lambda x: x[2])
+
+    def evict(self, target: int = None):
+        """删除最久未使用的结果直到总大小不超过 target（默认为上限），返回删除的个数"""
+        if target is None:
+            target = self.max_bytes
+        items = self.entries()
+        total = sum(size for _, size, _ in items)
+        removed = 0
+        for path, size, _ in items:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._total = total
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        self._total = None
+
+
+# ---------- 命令行 ----------
+def main():
+    parser = argparse.ArgumentParser(description="xConv formula result cache maintenance")
+    parser.add_argument('action', choices=['list', 'clear'], help='list entries or clear the cache')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='cache directory')
+    args = parser.parse_args()
+
+    cache = xConvResultCache(args.cache_dir)
+    if args.action == 'list':
+        items = cache.entries()
+        for path, size, _ in items:
+            print(f'{os.path.basename(path)}  {size / 1024:10.1f} KB')
+        print(f'{len(items)} entries, {sum(s for _, s, _ in items) / (1 << 20):.1f} MB / '
+              f'{cache.max_bytes / (1 << 20):.0f} MB')
+    else:
+        cache.clear()
+        print(f'Cleared {cache.cache_dir}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xConvSNPCache.py
+sNp 解析结果的二进制缓存（sidecar）
+1. 每个源文件对应缓存目录下的一个条目，条目名由源文件绝对路径的哈希决定；
+2. 条目内保存 freq.npy / s.npy（原始 .npy，可直接 memory-map）和 meta.json；
+3. 源文件大小、mtime 一致即命中；mtime 变化但内容哈希一致时同样命中并刷新 mtime；
+4. 命令行: python xConvSNPCache.py list|prune|clear [--cache-dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import numpy as np
+
+CACHE_VERSION = 1
+# 默认缓存目录，可用环境变量 XFRA_SNP_CACHE 覆盖
+DEFAULT_CACHE_DIR = os.environ.get(
+    'XFRA_SNP_CACHE', os.path.join(os.path.expanduser('~'), '.xFRA', 'snp_cache'))
+
+
+def content_hash(data: bytes) -> str:
+    """源文件内容哈希"""
+    return hashlib.sha1(data).hexdigest()
+
+
+class xConvSNPCache:
+    """sNp 解析结果缓存，freq 和 s 以 .npy 保存，读取时 memory-map"""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    # ---------- 条目定位 ----------
+    def entry_dir(self, src_path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(src_path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    @staticmethod
+    def _read_meta(entry: str):
+        try:
+            with open(os.path.join(entry, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get('version') == CACHE_VERSION else None
+
+    @staticmethod
+    def _write_meta(entry: str, meta: dict):
+        tmp = os.path.join(entry, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, os.path.join(entry, 'meta.json'))
+
+    def _is_fresh(self, entry: str, meta: dict) -> bool:
+        """检查条目是否与源文件一致；仅 mtime 变化时用内容哈希确认"""
+        try:
+            st = os.stat(meta['source'])
+        except OSError:
+            return False
+        if st.st_size != meta['size']:
+            return False
+        if st.st_mtime_ns == meta['mtime_ns']:
+            return True
+        with open(meta['source'], 'rb') as f:
+            if content_hash(f.read()) != meta['hash']:
+                return False
+        meta['mtime_ns'] = st.st_mtime_ns
+        self._write_meta(entry, meta)
+        return True
+
+    # ---------- 读写 ----------
+    def load(self, src_path: str):
+        """
+        命中时返回 (meta, freq, s)，freq/s 为只读 memory-map 数组；未命中返回 None
+        """
+        entry = self.entry_dir(src_path)
+        meta = self._read_meta(entry)
+        if meta is None or not self._is_fresh(entry, meta):
+            return None
+        try:
+            freq = np.load(os.path.join(entry, 'freq.npy'), mmap_mode='r')
+            s = np.load(os.path.join(entry, 's.npy'), mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        return meta, freq, s
+
+    def store(self, src_path: str, src_hash: str, freq: np.ndarray, s: np.ndarray,
+              src_stat: os.stat_result = None, **info):
+        """
+        写入条目；info 为需要随缓存保存的解析信息（端口数、z0 等），不能覆盖缓存自身的记录字段
+        src_stat 为读取源文件之前取得的 os.stat 结果，src_hash 和数组对应的正是那一版文件；
+        写入时源文件的大小或 mtime 已与之不同（解析期间被改写）则不写入，返回 False
+        """
+        src_path = os.path.abspath(src_path)
+        st = os.stat(src_path)
+        if src_stat is None:
+            src_stat = st
+        elif (st.st_size, st.st_mtime_ns) != (src_stat.st_size, src_stat.st_mtime_ns):
+            return False
+        entry = self.entry_dir(src_path)
+        os.makedirs(entry, exist_ok=True)
+        # 先删除旧的 meta，保证写入过程中条目不会被误判为有效
+        try:
+            os.remove(os.path.join(entry, 'meta.json'))
+        except FileNotFoundError:
+            pass
+        for name, arr in (('freq', freq), ('s', s)):
+            tmp = os.path.join(entry, name + '.tmp.npy')
+            np.save(tmp, np.ascontiguousarray(arr))
+            os.replace(tmp, os.path.join(entry, name + '.npy'))
+        meta = {'version': CACHE_VERSION, 'source': src_path, 'size': src_stat.st_size,
+                'mtime_ns': src_stat.st_mtime_ns, 'hash': src_hash}
+        reserved = meta.keys() & info.keys()
+        if reserved:
+            raise ValueError(f"缓存 info 不能使用保留字段: {sorted(reserved)}")
+        meta.update(info)
+        self._write_meta(entry, meta)
+        return True
+
+    def invalidate(self, src_path: str):
+        shutil.rmtree(self.entry_dir(src_path), ignore_errors=True)
+
+    # ---------- 维护 ----------
+    def entries(self):
+        """遍历 (条目目录, meta)；meta 无法读取时为 None"""
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in sorted(os.listdir(self.cache_dir)):
+            entry = os.path.join(self.cache_dir, name)
+            if os.path.isdir(entry):
+                yield entry, self._read_meta(entry)
+
+    def prune(self):
+        """删除源文件已不存在、已改动或损坏的条目，返回删除的条目数"""
+        removed = 0
+        for entry, meta in list(self.entries()):
+            if meta is None or not self._is_fresh(entry, meta):
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+# ---------- 命令行 ----------
+def main():
+    parser = argparse.ArgumentParser(description="xConv sNp binary cache maintenance")
+    parser.add_argument('action', choices=['list', 'prune', 'clear'], help='list entries, prune stale entries or clear the cache')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='cache directory')
+    args = parser.parse_args()
+
+    cache = xConvSNPCache(args.cache_dir)
+    if args.action == 'list':
+        for entry, meta in cache.entries():
+            if meta is None:
+                print(f'{os.path.basename(entry)}  <invalid>')
+            else:
+                state = 'ok' if cache._is_fresh(entry, meta) else 'stale'
+                print(f'{os.path.basename(entry)}  {state:5s}  {meta["source"]}')
+    elif args.action == 'prune':
+        print(f'Pruned {cache.prune()} stale entries from {cache.cache_dir}')
+    else:
+        cache.clear()
+        print(f'Cleared {cache.cache_dir}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,18 +2,30 @@
 # -*- coding: utf-8 -*-
 """
 s2p_ri_convert.py
-读取任意 *.s2p（v1） → 统一转成实部/虚部（RI） → 写回新文件
+读取任意 *.sNp（v1） → 统一转成实部/虚部（RI） → 写回新文件
 修正点：
 1. 严格解析频率单位，把频率列转换成 Hz 存储；
 2. 写回时按原单位还原；
 3. 保留原 option line 其余字段（参数、参考阻抗、注释）。
+用法：
+  python xConvSNPConverter.py your.s2p
+  python xConvSNPConverter.py data/ "lib/**/*.s2p" -j 8 [-r] [-f]   # 批量，进程池并行，跳过已是最新的 _RI 文件
 """
+import argparse
+import glob
+import os
+import re
 import sys
+import time
 import pathlib
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 
 # ---------- 工具 ----------
-FREQ_MUL = {'HZ': 1.0, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+try:
+    from .xConvSNPWriter import FREQ_MUL, write_snp
+except ImportError:     # 以脚本方式运行时 xConv 不是包
+    from xConvSNPWriter import FREQ_MUL, write_snp
 
 def _parse_option(line: str):
     """
@@ -34,6 +46,82 @@ def _parse_option(line: str):
     param, fmt, z0 = tok[1], tok[2], float(tok[4]) if len(tok) > 4 else 50.0
     return freq_unit, param, fmt, z0, mul
 
+def decode_pairs(a, b, fmt: str):
+    """
+    把成对的数值列 (a, b) 按 option line 的格式解码为复数
+    RI: 实部/虚部; MA: 幅度/角度(度); DB: dB/角度(度)
+    """
+    fmt = fmt.upper()
+    if fmt == 'RI':
+        return a + 1j * b
+    if fmt == 'MA':
+        mag = a
+    elif fmt == 'DB':
+        mag = 10**(a / 20.0)
+    else:
+        raise ValueError(f'Unknown format {fmt}')
+    return mag * np.exp(1j * b * np.pi / 180.0)
+
+def snp_n_ports(path, default=None):
+    """从扩展名 .sNp 推断端口数，无法推断时返回 default"""
+    m = re.search(r'\.s(\d+)p$', str(path), re.IGNORECASE)
+    return int(m.group(1)) if m else default
+
+def infer_n_ports(line: str):
+    """由单行（未折行）记录的列数反推端口数: 列数 = 1 + 2*N*N"""
+    cols = len(line.split())
+    n_ports = int(round(np.sqrt((cols - 1) / 2)))
+    if cols < 3 or 1 + 2 * n_ports * n_ports != cols:
+        raise ValueError(f'Cannot infer port count from {cols} columns')
+    return n_ports
+
+def record_width(n_ports: int, matrix_format: str = 'FULL') -> int:
+    """一条记录的数值个数: 频率 + 2*元素数；上/下三角只存 N*(N+1)/2 个元素"""
+    n_elem = n_ports * n_ports if matrix_format.upper() == 'FULL' else n_ports * (n_ports + 1) // 2
+    return 1 + 2 * n_elem
+
+def element_order(n_ports: int, matrix_format: str = 'FULL', two_port_order: str = '21_12'):
+    """
+    记录中各矩阵元素的 (行, 列) 下标，按文件中出现的顺序
+    Full: 2 端口按 [Two-Port Data Order]（v1 固定为 21_12，即 S11 S21 S12 S22），其余行优先
+    Lower / Upper: 按行给出下/上三角
+    """
+    matrix_format = matrix_format.upper()
+    if matrix_format == 'LOWER':
+        return np.tril_indices(n_ports)
+    if matrix_format == 'UPPER':
+        return np.triu_indices(n_ports)
+    if matrix_format != 'FULL':
+        raise ValueError(f'Unknown matrix format {matrix_format}')
+    rows, cols = np.indices((n_ports, n_ports)).reshape(2, -1)
+    if n_ports == 2 and two_port_order == '21_12':
+        rows, cols = cols, rows
+    return rows, cols
+
+def unpack_records(values, n_ports: int, fmt: str, matrix_format: str = 'FULL',
+                   two_port_order: str = '21_12', out=None):
+    """
+    把一维数值流按记录（频率 + 2*元素数 个数）切分，与记录是否折行无关
+    返回 (freq, s)，s 为 C 连续的 (点数, N, N) complex128，s[:, i, j] 对应 S(i+1)(j+1)
+    上/下三角格式按互易性对称填充；out=(freq, s) 时写入调用方预分配的数组
+    """
+    width = record_width(n_ports, matrix_format)
+    if values.size % width:
+        raise ValueError(f'{values.size} values is not a multiple of record width {width} ({n_ports}-port)')
+    raw = values.reshape(-1, width)
+    rows, cols = element_order(n_ports, matrix_format, two_port_order)
+    if out is None:
+        freq = np.empty(raw.shape[0], dtype=np.float64)
+        s = np.empty((raw.shape[0], n_ports, n_ports), dtype=np.complex128)
+    else:
+        freq, s = out
+    freq[:] = raw[:, 0]
+    vals = decode_pairs(raw[:, 1::2], raw[:, 2::2], fmt)
+    s[:, rows, cols] = vals
+    if matrix_format.upper() != 'FULL':
+        s[:, cols, rows] = vals
+    return freq, s
+
 def _read_v1(file):
     """返回 (freq_hz, data, option_line, comments, freq_unit, z0)"""
     comments, opt_line = [], None
@@ -48,60 +136,118 @@ def _read_v1(file):
     freq_unit, param, fmt, z0, mul = _parse_option(opt_line)
     if param != 'S':
         raise NotImplementedError('Only S-param supported')
-    # 收集数据行
+    # 收集数据行（去掉行内注释），多端口记录可以折行
     blk = []
     for raw in file:
-        line = raw.decode('utf-8').strip()
-        if line and not line.startswith('!'):
+        line = raw.decode('utf-8').split('!', 1)[0].strip()
+        if line:
             blk.append(line)
-    raw = np.loadtxt(blk)
-    freq_hz = raw[:, 0] * mul   # 统一转成 Hz
-    n_ports = int(np.sqrt((raw.shape[1] - 1) // 2))
-    if fmt == 'RI':
-        cplx = raw[:, 1:].view(np.complex128).reshape((-1, n_ports, n_ports))
-    elif fmt == 'MA':
-        mag, ang = raw[:, 1::2], raw[:, 2::2]
-        cplx = (mag * np.exp(1j * ang * np.pi / 180.0)).reshape((-1, n_ports, n_ports))
-    elif fmt == 'DB':
-        db, ang = raw[:, 1::2], raw[:, 2::2]
-        mag = 10**(db / 20.0)
-        cplx = (mag * np.exp(1j * ang * np.pi / 180.0)).reshape((-1, n_ports, n_ports))
-    else:
-        raise ValueError(f'Unknown format {fmt}')
+    n_ports = snp_n_ports(getattr(file, 'name', '')) or infer_n_ports(blk[0])
+    values = np.array(' '.join(blk).split(), dtype=np.float64)
+    freq, cplx = unpack_records(values, n_ports, fmt)
+    freq_hz = freq * mul   # 统一转成 Hz
     return freq_hz, cplx, opt_line, comments, freq_unit, z0
 
-def _write_v1(fname, freq_hz, data, old_opt, comments, freq_unit, z0):
-    """写回 v1，频率按原单位输出"""
-    inv_mul = 1.0 / FREQ_MUL[freq_unit]
-    # 构造新 option line，仅把格式改成 RI
-    tok = old_opt.upper().split()
-    tok[2] = 'RI'
-    new_opt = ' '.join(tok)          # ←←← 这里去掉前面的 '#'
-    n_ports = data.shape[2]
-    with open(fname, 'w', encoding='utf-8') as f:
-        for c in comments:
-            f.write(c + '\n')
-        f.write(new_opt + '\n')  # ←←← 只在这一处统一加 '# '
-        for i, fr in enumerate(freq_hz):
-            f.write(f'{fr * inv_mul:.10e} ')
-            for r in range(n_ports):
-                for c in range(n_ports):
-                    z = data[i, r, c]
-                    f.write(f'{z.real:.10e} {z.imag:.10e} ')
-            f.write('\n')
+def _write_v1(fname, freq_hz, data, old_opt, comments, freq_unit, z0, fmt='RI'):
+    """写回 v1，频率按原单位输出，由 xConvSNPWriter 批量格式化"""
+    # 构造新 option line，仅把格式改成 fmt，其余字段保持不变
+    tok = old_opt.upper().lstrip('#').split()
+    tok[2] = fmt                     # tok: [单位, 参数, 格式, 'R', z0]
+    new_opt = '# ' + ' '.join(tok)
+    write_snp(fname, freq_hz, data, fmt=fmt, freq_unit=freq_unit, z0=z0,
+              comments=comments, option_line=new_opt)
 
 # ---------- 主 ----------
-def convert_s2p_to_ri(src: pathlib.Path):
-    dst = src.with_name(src.stem + '_RI' + src.suffix)
+def ri_path(src: pathlib.Path) -> pathlib.Path:
+    return src.with_name(src.stem + '_RI' + src.suffix)
+
+def convert_s2p_to_ri(src: pathlib.Path, quiet: bool = False):
+    dst = ri_path(src)
     with open(src, 'rb') as f:
         freq_hz, data, opt, cmt, unit, z0 = _read_v1(f)
     _write_v1(dst, freq_hz, data, opt, cmt, unit, z0)
-    print(f'Converted -> {dst}')
+    if not quiet:
+        print(f'Converted -> {dst}')
+    return dst
+
+# ---------- 批量 ----------
+SNP_RE = re.compile(r'\.s\d+p$', re.IGNORECASE)
+
+def collect_sources(patterns, recursive: bool = False):
+    """把文件、目录和通配符展开成待转换的 sNp 列表（跳过 *_RI.sNp 输出文件），按路径去重"""
+    found = {}
+    for pat in patterns:
+        p = pathlib.Path(pat).expanduser()
+        if p.is_dir():
+            cands = p.rglob('*') if recursive else p.iterdir()
+        elif p.is_file():
+            cands = [p]
+        else:
+            cands = (pathlib.Path(x) for x in glob.glob(str(p), recursive=True))
+        for c in cands:
+            if c.is_file() and SNP_RE.search(c.name) and not c.stem.endswith('_RI'):
+                found.setdefault(c.resolve(), c)
+    return sorted(found.values())
+
+def is_up_to_date(src: pathlib.Path) -> bool:
+    dst = ri_path(src)
+    return dst.is_file() and dst.stat().st_mtime >= src.stat().st_mtime
+
+def _convert_worker(src: pathlib.Path):
+    """进程池工作函数，返回 (src, 源文件字节数, 错误信息或 None)"""
+    try:
+        convert_s2p_to_ri(src, quiet=True)
+        return src, src.stat().st_size, None
+    except Exception as e:
+        return src, 0, f'{type(e).__name__}: {e}'
+
+def convert_batch(sources, jobs: int = None, force: bool = False):
+    """在进程池中批量转换，返回统计字典"""
+    todo = [s for s in sources if force or not is_up_to_date(s)]
+    skipped = len(sources) - len(todo)
+    jobs = jobs or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    if jobs == 1 or len(todo) <= 1:
+        results = [_convert_worker(s) for s in todo]
+    else:
+        # 大批量时按块分发，减少进程间通信次数
+        chunksize = max(1, len(todo) // (jobs * 8))
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_convert_worker, todo, chunksize=chunksize))
+    elapsed = time.perf_counter() - t0
+    errors = [(src, err) for src, _, err in results if err]
+    n_ok = len(results) - len(errors)
+    n_bytes = sum(size for _, size, err in results if not err)
+    return {'converted': n_ok, 'skipped': skipped, 'errors': errors, 'bytes': n_bytes,
+            'seconds': elapsed, 'jobs': jobs}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Convert Touchstone v1 sNp files to RI format (<name>_RI.sNp)')
+    parser.add_argument('paths', nargs='+', help='files, directories or glob patterns (e.g. "lib/**/*.s2p")')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('-r', '--recursive', action='store_true', help='search directories recursively')
+    parser.add_argument('-f', '--force', action='store_true', help='convert even if the _RI output is up to date')
+    return parser.parse_args()
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: python s2p_ri_convert.py  your.s2p'); sys.exit(1)
-    src = pathlib.Path(sys.argv[1]).expanduser()
-    if not src.is_file():
-        print(f'File not found: {src}'); sys.exit(2)
-    convert_s2p_to_ri(src)
\ No newline at end of file
+    args = parse_args()
+    # 兼容旧用法: python xConvSNPConverter.py your.s2p
+    if len(args.paths) == 1 and not any(ch in args.paths[0] for ch in '*?['):
+        src = pathlib.Path(args.paths[0]).expanduser()
+        if not src.exists():
+            print(f'File not found: {src}'); sys.exit(2)
+        if src.is_file():
+            convert_s2p_to_ri(src)
+            sys.exit(0)
+    sources = collect_sources(args.paths, args.recursive)
+    if not sources:
+        print('No sNp files found'); sys.exit(2)
+    st = convert_batch(sources, args.jobs, args.force)
+    secs = max(st['seconds'], 1e-9)
+    print(f"Converted {st['converted']} files, skipped {st['skipped']} up-to-date, "
+          f"{len(st['errors'])} failed ({st['jobs']} workers)")
+    print(f"{st['seconds']:.2f} s, {st['converted'] / secs:.1f} files/s, "
+          f"{st['bytes'] / secs / 1e6:.2f} MB/s")
+    for src, err in st['errors']:
+        print(f'  FAILED {src}: {err}')
+    sys.exit(1 if st['errors'] else 0)
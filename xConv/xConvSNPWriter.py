@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xConvSNPWriter.py
+所有驱动共用的 Touchstone v1 / v2 写入器
+1. 输入 (点数, N, N) 复数数组，按 RI / MA / DB 输出；
+2. 先把整块数据排成 (点数, 1+2*元素数) 的浮点表，在字节层面一次性格式化整块
+   （含 inf/nan 等特殊值时回退到 % 模板），每 BLOCK_POINTS 个点写一次文件；
+3. v1: 2 端口列顺序为 S11 S21 S12 S22，3 端口及以上每个矩阵行单独成行，每行最多 4 对数值；
+4. v2: 写出 [Version] 2.0 等关键字段，支持逐端口参考阻抗、[Two-Port Data Order]
+   以及 Full / Lower / Upper 矩阵格式，3 端口及以上每个矩阵（三角）行单独成行。
+"""
+import numpy as np
+
+FREQ_MUL = {'HZ': 1.0, 'KHZ': 1e3, 'MHZ': 1e6, 'GHZ': 1e9}
+BLOCK_POINTS = 4096
+# 每种格式成对数值的列名前缀
+PAIR_LABELS = {'RI': ('Re', 'Im'), 'MA': ('Mag', 'Ang'), 'DB': ('dB', 'Ang')}
+
+
+def _port_order(n_ports: int, matrix_format: str = 'FULL', two_port_order: str = '21_12'):
+    """矩阵元素 (r, c) 在一条记录中的输出顺序，与 xConvSNPConverter.element_order 一致"""
+    matrix_format = matrix_format.upper()
+    if matrix_format == 'LOWER':
+        return [(r, c) for r in range(n_ports) for c in range(r + 1)]
+    if matrix_format == 'UPPER':
+        return [(r, c) for r in range(n_ports) for c in range(r, n_ports)]
+    if matrix_format != 'FULL':
+        raise ValueError(f'Unknown matrix format {matrix_format}')
+    if n_ports == 2 and two_port_order == '21_12':
+        return [(r, c) for c in range(n_ports) for r in range(n_ports)]
+    return [(r, c) for r in range(n_ports) for c in range(n_ports)]
+
+
+def encode_pairs(data: np.ndarray, fmt: str):
+    """把复数数组编码为成对数值 (a, b)，与 xConvSNPConverter.decode_pairs 互逆"""
+    fmt = fmt.upper()
+    if fmt == 'RI':
+        return data.real, data.imag
+    ang = np.angle(data, deg=True)
+    if fmt == 'MA':
+        return np.abs(data), ang
+    if fmt == 'DB':
+        return 20 * np.log10(np.maximum(np.abs(data), 1e-300)), ang
+    raise ValueError(f'Unknown format {fmt}')
+
+
+def record_separators(n_ports: int, precision: int = 10, matrix_format: str = 'FULL',
+                      pairs_per_line: int = 4):
+    """
+    一条记录中每个数值前面的分隔符（含折行和续行缩进），所有点共用
+    3 端口及以上每个矩阵（三角）行单独成行；pairs_per_line 为每行最多的数值对数，None 表示不限
+    """
+    order = _port_order(n_ports, matrix_format)
+    seps = [''] + [' '] * (2 * len(order))
+    if n_ports > 2:
+        indent = '\n' + ' ' * (precision + 8)
+        row_start = 0
+        for k, (r, _) in enumerate(order):
+            if k and r != order[k - 1][0]:
+                row_start = k
+            if k and (k == row_start or (pairs_per_line and (k - row_start) % pairs_per_line == 0)):
+                seps[1 + 2 * k] = indent
+    return seps
+
+
+def _format_fields(x: np.ndarray, precision: int):
+    """
+    字节级批量格式化: float64 数组 -> (..., precision+7) 的 uint8 字符数组
+    每个字段为 符号位(' ' 或 '-') + '%.{precision}e'，与 % 格式化结果一致
+    存在 inf/nan 或三位数指数时返回 None，由调用方回退到 % 格式化
+    """
+    if not np.isfinite(x).all():
+        return None
+    p = precision
+    a = np.abs(x)
+    nz = a > 0
+    e = np.zeros(x.shape, dtype=np.int64)
+    e[nz] = np.floor(np.log10(a[nz])).astype(np.int64)
+    if (np.abs(e) >= 99).any():
+        return None
+    mant = np.rint(a * 10.0 ** (p - e)).astype(np.int64)
+    # log10 在 10 的整数次幂附近可能差 1，修正指数后重新取整
+    hi = mant >= 10 ** (p + 1)
+    if hi.any():
+        e[hi] += 1
+        mant[hi] = np.rint(a[hi] * 10.0 ** (p - e[hi])).astype(np.int64)
+    lo = nz & (mant < 10 ** p)
+    if lo.any():
+        e[lo] -= 1
+        mant[lo] = np.rint(a[lo] * 10.0 ** (p - e[lo])).astype(np.int64)
+
+    out = np.empty(x.shape + (p + 7,), dtype=np.uint8)
+    out[..., 0] = np.where(np.signbit(x), ord('-'), ord(' '))
+    out[..., 1] = mant // 10 ** p + 48
+    out[..., 2] = ord('.')
+    for k in range(1, p + 1):
+        out[..., k + 2] = (mant // 10 ** (p - k)) % 10 + 48
+    out[..., p + 3] = ord('e')
+    out[..., p + 4] = np.where(e < 0, ord('-'), ord('+'))
+    ae = np.abs(e)
+    out[..., p + 5] = ae // 10 + 48
+    out[..., p + 6] = ae % 10 + 48
+    return out
+
+
+def format_records(freq_hz, data: np.ndarray, fmt: str = 'RI', freq_unit: str = 'HZ',
+                   precision: int = 10, matrix_format: str = 'FULL', two_port_order: str = '21_12',
+                   pairs_per_line: int = 4):
+    """按块产生格式化后的记录（bytes）"""
+    freq_hz = np.asarray(freq_hz, dtype=np.float64)
+    data = np.asarray(data)
+    n_pts, n_ports = data.shape[0], data.shape[1]
+    order = _port_order(n_ports, matrix_format, two_port_order)
+    rows = [r for r, _ in order]
+    cols = [c for _, c in order]
+    seps = record_separators(n_ports, precision, matrix_format, pairs_per_line)
+    sep_bytes = [np.frombuffer(sp.encode(), dtype=np.uint8) for sp in seps] + [np.frombuffer(b'\n', dtype=np.uint8)]
+    template = ''.join(sp + f'%.{precision}e' for sp in seps) + '\n'
+    inv_mul = 1.0 / FREQ_MUL[freq_unit.upper()]
+    for k in range(0, n_pts, BLOCK_POINTS):
+        blk = data[k:k + BLOCK_POINTS][:, rows, cols]
+        a, b = encode_pairs(blk, fmt)
+        table = np.empty((blk.shape[0], 1 + 2 * len(order)), dtype=np.float64)
+        table[:, 0] = freq_hz[k:k + BLOCK_POINTS] * inv_mul
+        table[:, 1::2] = a
+        table[:, 2::2] = b
+
+        fields = _format_fields(table, precision)
+        if fields is None:
+            yield ((template * table.shape[0]) % tuple(table.ravel().tolist())).encode()
+            continue
+        n = table.shape[0]
+        pieces = []
+        for j, sp in enumerate(sep_bytes[:-1]):
+            if sp.size:
+                pieces.append(np.broadcast_to(sp, (n, sp.size)))
+            pieces.append(fields[:, j, :])
+        pieces.append(np.broadcast_to(sep_bytes[-1], (n, 1)))
+        yield np.concatenate(pieces, axis=1).tobytes()
+
+
+def column_comment(n_ports: int, fmt: str = 'RI', matrix_format: str = 'FULL',
+                   two_port_order: str = '21_12') -> str:
+    """列说明注释，如 'Freq ReS11 ImS11 ReS21 ImS21 ...'"""
+    a, b = PAIR_LABELS[fmt.upper()]
+    names = []
+    for r, c in _port_order(n_ports, matrix_format, two_port_order):
+        names += [f'{a}S{r + 1}{c + 1}', f'{b}S{r + 1}{c + 1}']
+    return 'Freq ' + ' '.join(names)
+
+
+def write_snp(fname, freq_hz, data, fmt: str = 'RI', freq_unit: str = 'HZ', z0=50.0,
+              comments=(), option_line: str = None, precision: int = 10,
+              with_column_comment: bool = False, version: int = 1,
+              matrix_format: str = 'Full', two_port_order: str = '12_21'):
+    """
+    写 Touchstone 文件
+    freq_hz : (点数,) 频率 (Hz)
+    data    : (点数, N, N) 复数 S 参数，data[:, i, j] 为 S(i+1)(j+1)
+    z0      : 参考阻抗；v2 可给出每个端口的阻抗（长度 N），v1 只能是单一数值
+    option_line 不为空时原样写出（需与 fmt、freq_unit 一致），否则按参数生成
+    version=2 时写出 v2 关键字段，matrix_format 为 Full / Lower / Upper，
+    two_port_order 为 12_21 / 21_12（仅 2 端口有效）；v1 忽略这两个参数
+    """
+    data = np.asarray(data)
+    if data.ndim != 3 or data.shape[1] != data.shape[2]:
+        raise ValueError(f'data must have shape (points, N, N), got {data.shape}')
+    if len(freq_hz) != data.shape[0]:
+        raise ValueError(f'{len(freq_hz)} frequencies but {data.shape[0]} data points')
+    n_ports = data.shape[1]
+    z0 = np.broadcast_to(np.asarray(z0, dtype=np.float64), (n_ports,))
+    if version == 1:
+        if (z0 != z0[0]).any():
+            raise ValueError('Touchstone v1 only supports a single reference impedance, use version=2')
+        matrix_format, two_port_order, pairs_per_line = 'Full', '21_12', 4
+    elif version == 2:
+        matrix_format = matrix_format.capitalize()
+        pairs_per_line = None
+    else:
+        raise ValueError(f'Unsupported Touchstone version {version}')
+    if option_line is None:
+        option_line = f'# {freq_unit.upper()} S {fmt.upper()} R {z0[0]:g}'
+    header = [c if c.startswith('!') else '! ' + c for c in comments]
+    if version == 2:
+        header.append('[Version] 2.0')
+    header.append(option_line)
+    if version == 2:
+        header.append(f'[Number of Ports] {n_ports}')
+        if n_ports == 2:
+            header.append(f'[Two-Port Data Order] {two_port_order}')
+        header.append(f'[Number of Frequencies] {data.shape[0]}')
+        header.append('[Reference] ' + ' '.join(f'{z:g}' for z in z0))
+        header.append(f'[Matrix Format] {matrix_format}')
+    if with_column_comment:
+        header.append('! ' + column_comment(n_ports, fmt, matrix_format, two_port_order))
+    if version == 2:
+        header.append('[Network Data]')
+    with open(fname, 'wb') as f:
+        f.write(('\n'.join(header) + '\n').encode('utf-8'))
+        for chunk in format_records(freq_hz, data, fmt, freq_unit, precision,
+                                    matrix_format, two_port_order, pairs_per_line):
+            f.write(chunk)
+        if version == 2:
+            f.write(b'[End]\n')
+
+
+def s2p_from_pairs(s_data: dict) -> np.ndarray:
+    """
+    驱动常用的 {'s11': [re, im, re, im, ...], 's21': ..., 's12': ..., 's22': ...}
+    转为 (点数, 2, 2) 复数数组
+    """
+    n_pts = len(s_data['s11']) // 2
+    data = np.empty((n_pts, 2, 2), dtype=np.complex128)
+    for i in range(2):
+        for j in range(2):
+            v = np.asarray(s_data[f's{i + 1}{j + 1}'], dtype=np.float64)
+            data[:, i, j] = v[0::2] + 1j * v[1::2]
+    return data
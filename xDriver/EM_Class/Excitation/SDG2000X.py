@@ -88,8 +88,8 @@ class SDG2000X:
             channel_Str="C1"
         else:
             channel_Str="C2"
-        self.instr.write(channel_Str+":BSWV AMP,"+str(amplitude))
-        self.instr.write(channel_Str+":BSWV FRQ,"+str(freq))
+        # BSWV 可一次带多组参数，幅度和频率合成一条命令发送
+        self.instr.write(channel_Str+":BSWV AMP,"+str(amplitude)+",FRQ,"+str(freq))
 
     def set_waveform_type(self,channel:channel_number,waveform:waveform_type):
         if(channel == channel_number.ch1):
@@ -20,6 +20,7 @@ import sys
 sys.path.append('./')
 from custom_tunnel import instru_socket
 from custom_tunnel import instru_serial
+from custom_tunnel.instru_batch import batched
 import socket,serial
 import pyvisa
 import time
@@ -27,6 +28,11 @@ from enum import Enum
 sys.path.append('./xDriver/EM_Class/')
 from typedef import *
 
+# 采集同步: 设置改变后至少等待的整屏采集次数（丢掉设置生效前已开始的那一屏），轮询 :TRIG:STAT? 的起始/最大间隔 (s)
+ACQ_SCREENS = 2
+POLL_MIN = 0.005
+POLL_MAX = 0.05
+
 def voltageScaleLimiter(voltagescale,channel_atte,freq):
     if(voltagescale>10):
         return 10*channel_atte
@@ -43,6 +49,8 @@ class MSO5000:
         self.instr = None
         self.synctriggerEnable = False
         self.average_times = 1
+        self.sample_mode = sample_method.normal
+        self.timebase_scale = None
         self._setup_port()
     
     def autoscale(self):
@@ -69,6 +77,40 @@ class MSO5000:
             sample_delay=1 if 0.1>6*4*1/freq*2**self.average_times else 6*4*1/freq*2**self.average_times
         return sample_delay
 
+    def acquisitionTime(self):
+        """设置生效后得到一次有效测量所需的采集时间 (s)：ACQ_SCREENS 屏 × 平均次数"""
+        if self.timebase_scale is None:
+            self.timebase_scale = self.getTimebaseScale()
+        screens = ACQ_SCREENS
+        if self.sample_mode == sample_method.average:
+            screens *= 2**self.average_times
+        return screens*10*self.timebase_scale
+
+    def waitAcquisition(self,timeout=None):
+        """
+        等待设置生效后的一次有效采集，代替固定的 sleep(sample_delay)，返回实际等待时间 (s)
+        先用 *OPC? 等前面的命令执行完，再等 acquisitionTime()，然后指数退避轮询 :TRIG:STAT? 直到已触发
+        timeout 为等待上限，一般传入原来的 sample_delay，保证不会比固定延时更慢
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + timeout if timeout is not None else None
+        self.instr.query("*OPC?")
+        ready = t0 + self.acquisitionTime()
+        if deadline is not None:
+            ready = min(ready, deadline)
+        now = time.perf_counter()
+        if ready > now:
+            time.sleep(ready - now)
+        interval = POLL_MIN
+        # TD: 已触发; AUTO: 自动触发模式下无需等待; STOP: 已停止，读数不会再变
+        while self.instr.ask(":TRIG:STAT?").strip().upper() not in ("TD", "AUTO", "STOP"):
+            now = time.perf_counter()
+            if deadline is not None and now >= deadline:
+                break
+            time.sleep(interval if deadline is None else min(interval, deadline - now))
+            interval = min(interval*2, POLL_MAX)
+        return time.perf_counter() - t0
+
     def voltage(self,channel:channel_number,items:wave_parameter):
         max_try_times = 5
         loopcounter = 0
@@ -81,7 +123,7 @@ class MSO5000:
         while(voltage>channel_scale*8 and loopcounter<max_try_times):#When amplitude is too large, auto scale
             print("CH1 voltage scale too large, voltage is "+str(voltage)+",scale is "+str(channel_scale)+", Freq is "+str(freq))
             self.setChannelScale(channel,channel_scale*8)
-            time.sleep(self.getSampleDelay(freq))
+            self.waitAcquisition(sample_delay)
             channel_scale=channel_scale*8
             channel_scale = voltageScaleLimiter(channel_scale,channel_atte,freq)
             voltage=self.getvoltage(channel,wave_parameter.Peak2Peak)
@@ -89,7 +131,7 @@ class MSO5000:
         loopCounter = 0
         # 当幅度过大的时候采用RMS代替Peak值
         while((voltage<2*channel_atte or voltage>6*channel_atte) and loopCounter<max_try_times):
-            time.sleep(sample_delay)
+            self.waitAcquisition(sample_delay)
             voltage=self.getvoltage(channel,wave_parameter.Peak2Peak)
             if(voltage>1e10):
                 voltage=self.getvoltage(channel,wave_parameter.rms)*4*1.414
@@ -122,20 +164,23 @@ class MSO5000:
         with open(file_name,"w") as f:
             print("Store "+str(channel)+" "+str(memory_length)+" points data to "+file_name)
             if(data_mode==memory_store_method.screen_only):
-                self.instr.write(":WAV:MODE NORM")
-                self.instr.write(":WAV:POIN "+str(memory_length))
-                self.instr.write(":WAV:FORMAT ASCII")
-                data_line=self.instr.ask(":WAV:DATA?")
+                # 设置命令和查询合成一条消息发送
+                with batched(self):
+                    self.instr.write(":WAV:MODE NORM")
+                    self.instr.write(":WAV:POIN "+str(memory_length))
+                    self.instr.write(":WAV:FORMAT ASCII")
+                    data_line=self.instr.ask(":WAV:DATA?")
                 data_point=data_line.split(",")
                 f.write("Voltage\r\n")
                 data_point[0]=data_point[0][11:]
                 for data in data_point:
                     f.write(data+"\r\n")
             if(data_mode==memory_store_method.RAW_data):
-                self.instr.write(":WAV:MODE RAW")
-                self.instr.write(":WAV:POIN "+str(memory_length))
-                self.instr.write(":WAV:FORMAT ASCII")
-                self.instr.write(":STOP")
+                with batched(self):
+                    self.instr.write(":WAV:MODE RAW")
+                    self.instr.write(":WAV:POIN "+str(memory_length))
+                    self.instr.write(":WAV:FORMAT ASCII")
+                    self.instr.write(":STOP")
                 print("start time:")
                 print(time.time())
                 data_line=self.instr.ask(":WAV:DATA?")
@@ -151,8 +196,10 @@ class MSO5000:
 
     def setAcquire(self,memdepth:memory_store_depth=memory_store_depth.depth_AUTO,\
         samplemode:sample_method=sample_method.normal):
-        self.instr.write(":ACQ:TYPE "+samplemode.value)
-        self.instr.write(":ACQ:MDEP "+memdepth.value)
+        with batched(self):
+            self.instr.write(":ACQ:TYPE "+samplemode.value)
+            self.instr.write(":ACQ:MDEP "+memdepth.value)
+        self.sample_mode = samplemode
         # print("Memory Depth of "+self.model+" locates at "+self.addr+" set to "+self.instr.ask(":ACQ:MDEP?"))
         # print("Acquire Mode of "+self.model+" locates at "+self.addr+" set to "+self.instr.ask(":ACQ:TYPE?"))
         time.sleep(1)
@@ -166,6 +213,7 @@ class MSO5000:
 
     def setTimebaseScale(self,timebase_scale):
         self.instr.write(":TIM:SCAL "+str(timebase_scale))
+        self.timebase_scale = timebase_scale
     
     def setChannelOffet(self,channel:channel_number,offset):
         self.instr.write(":"+channel.value+":OFFS "+str(offset))
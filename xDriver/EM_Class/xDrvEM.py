@@ -11,6 +11,11 @@ import argparse
 from enum import Enum
 import time
 from typedef import *
+sys.path.append('./')
+from custom_tunnel.instru_batch import batched
+
+# 相位读数超出 ±180° 时的最大重读次数
+max_try_times = 20
 # -------------------- 参数解析函数 --------------------
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -134,101 +139,148 @@ class PyBode():
     def setOutputFile(self,outputfile):
         self.output_file = outputfile
 
-    def run(self,\
+    def waitMeasurement(self,sample_delay):
+        """测量设备实现了 waitAcquisition 时等到采集完成（不超过 sample_delay），否则固定等待 sample_delay"""
+        if hasattr(self.m_instru,"waitAcquisition"):
+            self.m_instru.waitAcquisition(sample_delay)
+        else:
+            time.sleep(sample_delay)
+
+    def run_blocks(self,\
             ExcitationChannel:channel_number,\
             inputChannel:channel_number,\
             outputChannel:channel_number,\
             syncTrigger:channel_number,\
             ):
+        """
+        流式测量: 每测完一个频率点产生 (下标, 数据块)
+        数据块为 (1, 5) 数组，列为 freq, voltage1, voltage2, gain(dB), phase(°)
+        每个频率点打印设置、等待采集、读电压、读相位各阶段耗时，结束时打印合计
+        """
         m_instru=self.m_instru
         e_instru=self.e_instru
 
         freq_list=self.freq_list
         amplitude_list=self.amplitude_list
-        totalPoints=len(freq_list)
-
-        df=pd.DataFrame({}, columns=['freq', 'gain', 'phase'])
 
         m_instru.setTimebaseScale(10)
 
         # 读取初始状态的量程和衰减
         channel1_scale=m_instru.getChannelScale(inputChannel)
         channel2_scale=m_instru.getChannelScale(outputChannel)
-        counter = 1
 
         channel1_atte = m_instru.getChannelAtte(inputChannel)
         channel2_atte = m_instru.getChannelAtte(outputChannel)
+        timing_total = dict.fromkeys(("set","wait","voltage","phase"),0.0)
+        for counter, freq in enumerate(tqdm(freq_list)):
+            timing = dict.fromkeys(timing_total,0.0)
+            t_last = time.perf_counter()
+            def lap(stage):
+                nonlocal t_last
+                now = time.perf_counter()
+                timing[stage] += now - t_last
+                t_last = now
+            Ampilitude=amplitude_list[counter]
+            # 设置计算采样延时
+            if(self.syncTriggerEnable == False):
+                sample_delay=0.1 if 0.1>4*1/freq*2**self.average_times else 4*1/freq*2**self.average_times
+            else:
+                sample_delay=1 if 0.1>6*4*1/freq*2**self.average_times else 6*4*1/freq*2**self.average_times
+            # 设置频率和幅度
+            e_instru.set_freq_amp(freq,Ampilitude,ExcitationChannel)
+            # 设置同步触发时的方波频率
+            if(self.syncTriggerEnable == True):
+                freqSquare=freq
+                while(freqSquare>e_instru.getMaxSquareWaveformFreq()):# 获取最大方波输出频率
+                    freqSquare=freqSquare/2
+                e_instru.set_freq_amp(freqSquare,1,syncTrigger)    #set signal source
+
+            # 设置示波器时间幅度
+            m_instru.setTimebaseScale(0.25*1/freq)
+            lap("set")
+
+            # 等待测量稳定（采集完成即返回，sample_delay 为上限）
+            self.waitMeasurement(sample_delay)
+            lap("wait")
+
+            # 读取电压值
+            voltage1=m_instru.voltage(inputChannel,wave_parameter.Peak2Peak)
+            voltage2=m_instru.voltage(outputChannel,wave_parameter.Peak2Peak)
+            lap("voltage")
+
+            self.waitMeasurement(sample_delay) #wait for measure
+            lap("wait")
+
+            voltage1=m_instru.voltage(inputChannel,wave_parameter.RMS)
+            lap("voltage")
+# stop here 2025年12月14日
+            self.waitMeasurement(sample_delay)
+            lap("wait")
+            voltage2=m_instru.voltage(outputChannel,wave_parameter.RMS)
+            lap("voltage")
+            print("freq:",freq)
+            print("voltage1:",voltage1)
+            print("voltage2:",voltage2)
+            phase=-1*m_instru.phase(inputChannel,outputChannel)
+            while(phase>360 or phase <-360):
+                phase=-1*m_instru.phase(inputChannel,outputChannel)
+            loopCounter = 0
+            while(phase > 180 or phase<-180 and loopCounter<max_try_times):
+                phase=-1*m_instru.phase(inputChannel,outputChannel)
+                loopCounter = loopCounter + 1
+            if(loopCounter >= max_try_times):
+                phase = 0
+            lap("phase")
+            print("timing(ms):",", ".join(f"{k} {v*1e3:.1f}" for k,v in timing.items()),
+                  f"total {sum(timing.values())*1e3:.1f}")
+            for k in timing:
+                timing_total[k] += timing[k]
+            gain=20*math.log(voltage2/voltage1,10)
+            yield counter, np.array([[freq, voltage1, voltage2, gain, phase]])
+        total = sum(timing_total.values())
+        if total > 0:
+            print(f"Sweep timing: {len(freq_list)} points, {total:.2f} s,",
+                  ", ".join(f"{k} {v/total*100:.0f}%" for k,v in timing_total.items()))
+
+    def run(self,\
+            ExcitationChannel:channel_number,\
+            inputChannel:channel_number,\
+            outputChannel:channel_number,\
+            syncTrigger:channel_number,\
+            ):
+        """完整测量并写出数据文件，返回 DataFrame(freq, gain, phase)"""
+        rows = []
         filename=self.output_file
         with open(".\\temp\\datafilename.txt","w") as f:
             f.write(filename)
         with open(".\\ExampleData\\"+filename,"w") as f:
-            for freq in tqdm(freq_list):
-                Ampilitude=amplitude_list[counter-1]
-                counter = counter + 1
-                # 设置计算采样延时
-                if(self.syncTriggerEnable == False):
-                    sample_delay=0.1 if 0.1>4*1/freq*2**self.average_times else 4*1/freq*2**self.average_times
-                else:
-                    sample_delay=1 if 0.1>6*4*1/freq*2**self.average_times else 6*4*1/freq*2**self.average_times
-                # 设置频率和幅度
-                e_instru.set_freq_amp(freq,Ampilitude,ExcitationChannel)
-                # 设置同步触发时的方波频率
-                if(self.syncTriggerEnable == True):
-                    freqSquare=freq
-                    while(freqSquare>e_instru.getMaxSquareWaveformFreq()):# 获取最大方波输出频率
-                        freqSquare=freqSquare/2
-                    e_instru.set_freq_amp(freqSquare,1,syncTrigger)    #set signal source
-            
-                # 设置示波器时间幅度
-                m_instru.setTimebaseScale(0.25*1/freq)
-
-                # 等待测量稳定
-                time.sleep(sample_delay)
-                
-                # 读取电压值
-                voltage1=m_instru.voltage(inputChannel,wave_parameter.Peak2Peak)
-                voltage2=m_instru.voltage(outputChannel,wave_parameter.Peak2Peak)
-
-                time.sleep(sample_delay) #wait for measure
-
-                voltage1=m_instru.voltage(inputChannel,wave_parameter.RMS)
-# stop here 2025年12月14日
-                time.sleep(sample_delay)
-                voltage2=m_instru.voltage(outputChannel,wave_parameter.RMS)
-                print("freq:",freq)
-                print("voltage1:",voltage1)
-                print("voltage2:",voltage2)
-                phase=-1*m_instru.phase(inputChannel,outputChannel)
-                while(phase>360 or phase <-360):
-                    phase=-1*m_instru.phase(inputChannel,outputChannel)
-                loopCounter = 0
-                while(phase > 180 or phase<-180 and loopCounter<max_try_times):
-                    phase=-1*m_instru.phase(inputChannel,outputChannel)
-                    loopCounter = loopCounter + 1
-                if(loopCounter >= 20):
-                    phase = 0
-                gain=20*math.log(voltage2/voltage1,10)
-                # print(str(freq)+","+str(voltage1)+","+str(voltage2)+","+str(gain)+","+str(phase))
-                f.write(str(freq)+","+str(voltage1)+","+str(voltage2)+","+str(gain)+","+str(phase)+","+str(0.5*Ampilitude/math.sqrt(2))+"\r")
-                df.loc[len(df.index)]=[freq,gain,phase]
-            f.close()
+            for counter, block in self.run_blocks(ExcitationChannel, inputChannel, outputChannel, syncTrigger):
+                for k, (freq, voltage1, voltage2, gain, phase) in enumerate(block):
+                    Ampilitude=self.amplitude_list[counter + k]
+                    f.write(str(freq)+","+str(voltage1)+","+str(voltage2)+","+str(gain)+","+str(phase)+","+str(0.5*Ampilitude/math.sqrt(2))+"\r")
+                rows.append(block[:, [0, 3, 4]])
+        data = np.concatenate(rows) if rows else np.empty((0, 3))
+        return pd.DataFrame(data, columns=['freq', 'gain', 'phase'])
 
     def setChannel(self,excitionchannel,inputchannel,outputchannel,\
                    synctrigger,syncchannel,samplemethod,averageTimes):
         self.sample_method=samplemethod
         self.average_times=averageTimes
         self.syncChannel=syncchannel
+        # 示波器的连续设置命令合并成一条消息发送；setAcquire 内部要等待，单独发送
         if(self.syncTriggerEnable == True):
-            self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(syncchannel,couple_type.ac)
-            self.m_instru.setChannelOffet(inputchannel,0)
-            self.m_instru.setChannelOffet(outputchannel,0)
-            self.m_instru.setChannelOffet(syncchannel,0)
+            with batched(self.m_instru):
+                self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(syncchannel,couple_type.ac)
+                self.m_instru.setChannelOffet(inputchannel,0)
+                self.m_instru.setChannelOffet(outputchannel,0)
+                self.m_instru.setChannelOffet(syncchannel,0)
             self.m_instru.setAcquire(samplemode=samplemethod)
-            self.m_instru.setAverageTimes(averageTimes)
-            self.m_instru.setTriggerChannel(syncchannel)
-            self.m_instru.setTriggerLevel(0)
+            with batched(self.m_instru):
+                self.m_instru.setAverageTimes(averageTimes)
+                self.m_instru.setTriggerChannel(syncchannel)
+                self.m_instru.setTriggerLevel(0)
 
             self.e_instru.set_waveform_type(excitionchannel,waveform_type.sin)
             self.e_instru.set_waveform_type(synctrigger,waveform_type.square)
@@ -236,14 +288,16 @@ class PyBode():
             self.e_instru.setChannelOutputState(excitionchannel,1)
             return
         else:
-            self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
-            self.m_instru.setChannelOffet(inputchannel,0)
-            self.m_instru.setChannelOffet(outputchannel,0)
+            with batched(self.m_instru):
+                self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
+                self.m_instru.setChannelOffet(inputchannel,0)
+                self.m_instru.setChannelOffet(outputchannel,0)
             self.m_instru.setAcquire(samplemode=samplemethod)
 
-            self.m_instru.setTriggerChannel(inputchannel)
-            self.m_instru.setTriggerLevel(0)
+            with batched(self.m_instru):
+                self.m_instru.setTriggerChannel(inputchannel)
+                self.m_instru.setTriggerLevel(0)
 
             self.e_instru.set_waveform_type(excitionchannel,waveform_type.sin)
             self.e_instru.setChannelOutputState(excitionchannel,1)
@@ -251,28 +305,32 @@ class PyBode():
     def setOSCChannel(self,inputchannel,outputchannel,\
                    syncchannel,samplemethod,averageTimes,freq):
         if(self.syncTriggerEnable == True):
-            self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(syncchannel,couple_type.ac)
-            self.m_instru.setChannelOffet(inputchannel,0)
-            self.m_instru.setChannelOffet(outputchannel,0)
-            self.m_instru.setChannelOffet(syncchannel,0)
+            with batched(self.m_instru):
+                self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(syncchannel,couple_type.ac)
+                self.m_instru.setChannelOffet(inputchannel,0)
+                self.m_instru.setChannelOffet(outputchannel,0)
+                self.m_instru.setChannelOffet(syncchannel,0)
             self.m_instru.setAcquire(samplemode=samplemethod)
-            self.m_instru.setAverageTimes(averageTimes)
-            self.m_instru.setTriggerChannel(syncchannel)
-            self.m_instru.setTriggerLevel(0)
-            self.m_instru.setTimebaseScale(0.25*1/freq)
+            with batched(self.m_instru):
+                self.m_instru.setAverageTimes(averageTimes)
+                self.m_instru.setTriggerChannel(syncchannel)
+                self.m_instru.setTriggerLevel(0)
+                self.m_instru.setTimebaseScale(0.25*1/freq)
             return
         else:
-            self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
-            self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
-            self.m_instru.setChannelOffet(inputchannel,0)
-            self.m_instru.setChannelOffet(outputchannel,0)
+            with batched(self.m_instru):
+                self.m_instru.setChannelCouple(inputchannel,couple_type.ac)
+                self.m_instru.setChannelCouple(outputchannel,couple_type.ac)
+                self.m_instru.setChannelOffet(inputchannel,0)
+                self.m_instru.setChannelOffet(outputchannel,0)
             self.m_instru.setAcquire(samplemode=samplemethod)
 
-            self.m_instru.setTriggerChannel(inputchannel)
-            self.m_instru.setTriggerLevel(0)
-            self.m_instru.setTimebaseScale(0.25*1/freq)
+            with batched(self.m_instru):
+                self.m_instru.setTriggerChannel(inputchannel)
+                self.m_instru.setTriggerLevel(0)
+                self.m_instru.setTimebaseScale(0.25*1/freq)
             return
 
 # -------------------- 主流程 --------------------
@@ -346,8 +404,10 @@ if __name__=="__main__":
             syncChannel=channel
 
     uPyBode.setChannel(excitionChannel,inputChannel,outputChannel,\
-                       syncTrigger,syncChannel,sampleMethod,args.average_times)
+                       syncTrigger,syncChannel,sampleMethod,average_sample_times)
 
-    uPyBode.run(start_freq,end_freq,sweep_points,source_amp\
-                ,ExcitationChannel=excitionChannel,inputChannel=inputChannel,outputChannel=outputChannel,\
+    uPyBode.generate_freq_sourcelevel_list(start_freq,end_freq,sweep_type,sweep_points,source_amp,\
+                                           variable_amp,variable_amp_freq)
+    uPyBode.setOutputFile(output_file)
+    uPyBode.run(ExcitationChannel=excitionChannel,inputChannel=inputChannel,outputChannel=outputChannel,\
                 syncTrigger=syncTrigger)
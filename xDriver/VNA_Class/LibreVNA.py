@@ -27,7 +27,12 @@ import sys
 import time
 import socket
 import json
+import re
+from types import SimpleNamespace
 import numpy as np
+sys.path.append('./')
+from xConv.xConvSNPWriter import write_snp
+from custom_tunnel.instru_stats import instru_stats
 
 # ---------- 工具函数 ----------
 def scpi_cmd(sock, cmd):
@@ -38,15 +43,36 @@ def scpi_query(sock, cmd, timeout=20):
     """发送查询并返回去尾字符串"""
     sock.settimeout(timeout)
     scpi_cmd(sock, cmd)
-    # 返回所有数据
-    data = b""
-    while True:
-        chunk = sock.recv(4096)
+    # 读到结尾的换行符为止；大迹线会分成多个 TCP 包到达，不能以短包判断结束
+    data = bytearray()
+    while not data.endswith(b"\n"):
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("Connection closed by LibreVNA")
         data += chunk
-        if len(chunk) < 4096:
-            break
     return data.decode().strip()
 
+def scpi_query_multi(sock, cmds, timeout=20):
+    """
+    多条查询用 ';' 拼成一条消息发送（一次往返），返回各条应答组成的列表
+    应答之间以 ';' 或换行分隔；应答条数不符时抛出 ValueError
+    """
+    sock.settimeout(timeout)
+    scpi_cmd(sock, ";".join(cmds))
+    data = bytearray()
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            raise ConnectionError("Connection closed by LibreVNA")
+        data += chunk
+        if data.endswith(b"\n"):
+            parts = re.split(rb"[;\n]", bytes(data).strip())
+            if len(parts) >= len(cmds):
+                break
+    if len(parts) != len(cmds):
+        raise ValueError(f"Expected {len(cmds)} responses, got {len(parts)}")
+    return [p.decode().strip() for p in parts]
+
 def connect_scpi(addr, port=19542):
     """返回已连接的 socket"""
     s = socket.create_connection((addr, port), timeout=5)
@@ -59,7 +85,8 @@ def connect_scpi(addr, port=19542):
     return s
 
 # ---------- 参数解析（与 SVA1000X.py 完全一致） ----------
-def parse_arguments():
+def parse_arguments(argv=None):
+    """argv 为空时解析命令行；measurement runner 进程内调用时传入参数列表"""
     parser = argparse.ArgumentParser(description="LibreVNA S2P Measurement Driver")
     parser.add_argument("--device-tunnel", default="SCPI", help="Connection tunnel type")
     parser.add_argument("--device-address", required=True,
@@ -74,7 +101,9 @@ def parse_arguments():
     parser.add_argument("--source-level", type=float, default=-10, help="Source power in dBm")
     parser.add_argument("--calibration", help="Local cal file to load (*.cal)")
     parser.add_argument("--output-file", required=True, help="Output .s2p file")
-    return parser.parse_args()
+    parser.add_argument("--batch-fetch", default="AUTO", choices=["AUTO", "ON", "OFF"],
+                        help="一条消息查询扫描状态和 4 条迹线: AUTO 在连接时探测一次仪器是否支持")
+    return parser.parse_args(argv)
 
 # ---------- 仪器配置 ----------
 def configure_instrument(sock, args):
@@ -120,45 +149,104 @@ def configure_instrument(sock, args):
     print("Instrument configured.")
 
 # ---------- 测量 ----------
-def perform_measurement(sock):
+POLL_INTERVAL = 0.2     # 扫描进行中读取部分迹线的最小间隔 (s)
+# 轮询间隔随扫描已用时间增长（已用时间 × POLL_BACKOFF），轮询时刻呈等比数列，
+# 每次都要下载已测到的全部点，这样整次扫描的总传输量约为完整迹线的 1/POLL_BACKOFF 倍，而不随扫描长度平方增长
+POLL_BACKOFF = 0.25
+# 迹线名 -> S 矩阵下标
+TRACES = (("S11", 0, 0), ("S21", 1, 0), ("S12", 0, 1), ("S22", 1, 1))
+
+def start_measurement(sock):
     print("Performing measurement...")
-    scpi_cmd(sock, "VNA:ACQ:SINGLE TRUE")   # 单次扫描
-    scpi_cmd(sock, "*WAI")                  # 等待完成
+    scpi_cmd(sock, "VNA:ACQ:SINGLE TRUE")   # 单次扫描，不等待完成
+
+def sweep_finished(sock):
+    return scpi_query(sock, "VNA:ACQ:FIN?").upper() == "TRUE"
+
+_BRACKETS = str.maketrans('', '', '[]')
+
+def parse_trace(raw):
+    """
+    LibreVNA 迹线文本 '[freq,re,im],[freq,re,im],...' -> (点数, 3) 数组
+    LibreVNA 的 SCPI 没有二进制迹线格式，这里去掉括号后由 NumPy 一次解析全部数值
+    """
+    raw = raw.translate(_BRACKETS)
+    if not raw.strip():
+        return np.empty((0, 3))
+    values = np.fromstring(raw, dtype=np.float64, sep=',')
+    if values.size % 3:
+        raise ValueError(f"Malformed trace data ({values.size} values)")
+    return values.reshape(-1, 3)
+
+def assemble_traces(raws):
+    """
+    4 条迹线文本 -> (频率 (点数,), S 参数 (点数, 2, 2) 复数数组)
+    扫描进行中各迹线点数可能不同，取最短的
+    """
+    traces = [parse_trace(raw) for raw in raws]
+    n = min(len(t) for t in traces)
+    data = np.empty((n, 2, 2), dtype=np.complex128)
+    for t, (_, i, j) in zip(traces, TRACES):
+        data[:, i, j].real = t[:n, 1]
+        data[:, i, j].imag = t[:n, 2]
+    return traces[0][:n, 0].copy(), data
 
 def retrieve_data(sock):
-    """返回 dict: {'s11':[re,im,...], 's21':[], 's12':[], 's22':[]}"""
-    print("Retrieving trace data...")
-    s_params = {}
-    for tr in ("S11", "S21", "S12", "S22"):
-        raw = scpi_query(sock, f"VNA:TRAC:DATA? {tr}")
-        # LibreVNA 返回:  [freq, re, im], [freq, re, im], ...
-        pairs = [ln.split(',') for ln in raw.strip('[]').split('],[')]
-        values = []
-        for p in pairs:
-            values.extend([float(p[1]), float(p[2])])  # re, im
-        s_params[tr.lower()] = values
-    return s_params
-
-# ---------- S2P 写入（与 SVA1000X.py 完全一致） ----------
-def write_s2p(filename, freqs, s_data):
+    """读取 4 条迹线当前已测到的点（每条迹线一次查询）"""
+    return assemble_traces([scpi_query(sock, f"VNA:TRAC:DATA? {tr}") for tr, _, _ in TRACES])
+
+def poll_sweep(session):
+    """
+    查询扫描是否结束并读取当前迹线，返回 (是否结束, 频率, S 参数)
+    批量模式下 VNA:ACQ:FIN? 和 4 条 VNA:TRAC:DATA? 合成一条消息，一次往返代替五次
+    """
+    if session.batch == "ON":
+        cmds = ["VNA:ACQ:FIN?"] + [f"VNA:TRAC:DATA? {tr}" for tr, _, _ in TRACES]
+        fin, *raws = scpi_query_multi(session.sock, cmds)
+        return (fin.upper() == "TRUE",) + assemble_traces(raws)
+    # 先查询是否结束再读数据，结束后读到的一定是完整迹线
+    finished = sweep_finished(session.sock)
+    return (finished,) + retrieve_data(session.sock)
+
+PROBE_TIMEOUT = 1.0     # 批量查询探测的超时 (s)，固件不支持时尽快确定
+
+def probe_batch(sock):
+    """连接时探测一次仪器是否支持 ';' 拼接的多条查询，不在扫描中途靠超时发现"""
+    try:
+        scpi_query_multi(sock, ["*IDN?", "*IDN?"], timeout=PROBE_TIMEOUT)
+        return True
+    except (socket.timeout, ValueError):
+        drain(sock)
+        return False
+
+def drain(sock):
+    """丢弃探测失败后残留的应答"""
+    sock.settimeout(0.5)
+    try:
+        while sock.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+
+def sweep_freqs(args):
+    """按扫描设置生成频率点 (Hz)"""
+    if args.sweep_points <= 1:
+        return np.array([args.start_freq])
+    if args.sweep_type == "LIN":
+        return np.linspace(args.start_freq, args.stop_freq, args.sweep_points)
+    return np.logspace(np.log10(args.start_freq), np.log10(args.stop_freq), args.sweep_points)
+
+# ---------- S2P 写入（与 SVA1000X.py 完全一致，共用 xConvSNPWriter） ----------
+def write_s2p(filename, freqs, data):
+    """data 为 (点数, 2, 2) 复数数组"""
     print(f"Exporting to {filename}...")
-    with open(filename, 'w') as f:
-        f.write("! Touchstone file generated by LibreVNA.py\n")
-        f.write("# Hz S RI R 50\n")
-        f.write("! Freq ReS11 ImS11 ReS21 ImS21 ReS12 ImS12 ReS22 ImS22\n")
-        n = len(freqs)
-        for i in range(n):
-            idx = i * 2
-            line = f"{freqs[i]:.6e} "
-            line += f"{s_data['s11'][idx]:.6f} {s_data['s11'][idx+1]:.6f} "
-            line += f"{s_data['s21'][idx]:.6f} {s_data['s21'][idx+1]:.6f} "
-            line += f"{s_data['s12'][idx]:.6f} {s_data['s12'][idx+1]:.6f} "
-            line += f"{s_data['s22'][idx]:.6f} {s_data['s22'][idx+1]:.6f}\n"
-            f.write(line)
+    write_snp(filename, freqs, data,
+              comments=["Touchstone file generated by LibreVNA.py"],
+              with_column_comment=True)
 
-# ---------- 主函数 ----------
-def main():
-    args = parse_arguments()
+# ---------- 会话接口（命令行和 meas_runner 共用） ----------
+def open_session(args):
+    """连接并配置仪器，返回会话（统计 SCPI 收发的 socket 和批量查询设置）"""
     # 解析地址
     if ':' in args.device_address:
         ip, port = args.device_address.split(':', 1)
@@ -169,40 +257,68 @@ def main():
     sock = connect_scpi(ip, port)
     try:
         configure_instrument(sock, args)
+        batch = args.batch_fetch
+        if batch == "AUTO":
+            batch = "ON" if probe_batch(sock) else "OFF"
+            print(f"Batched query: {batch}")
+    except Exception:
+        sock.close()
+        raise
+    return SimpleNamespace(sock=instru_stats(sock), batch=batch)
 
-        if args.averages > 1:
-            s_acc = None
-            for i in range(args.averages):
-                print(f"Acquisition {i+1}/{args.averages}")
-                perform_measurement(sock)
-                d = retrieve_data(sock)
-                print("Data retrieved.", d)
-                if s_acc is None:
-                    s_acc = d
-                else:
-                    for k in s_acc:
-                        s_acc[k] = [a + b for a, b in zip(s_acc[k], d[k])]
-            s_data = {k: [v / args.averages for v in s_acc[k]] for k in s_acc}
-        else:
-            perform_measurement(sock)
-            s_data = retrieve_data(sock)
-
-        # 生成频率列表
-        if args.sweep_type == "LIN":
-            if args.sweep_points > 1:
-                step = (args.stop_freq - args.start_freq) / (args.sweep_points - 1)
-                freqs = [args.start_freq + i * step for i in range(args.sweep_points)]
-            else:
-                freqs = [args.start_freq]
-        else:
-            freqs = np.logspace(np.log10(args.start_freq),
-                                np.log10(args.stop_freq),
-                                args.sweep_points).tolist()
-
-        write_s2p(args.output_file, freqs, s_data)
+def sweep_blocks(session, args):
+    """
+    流式测量: 扫描进行中轮询部分迹线，每收到一批新点产生 (起始下标, 频率块, S 参数块)
+    平均次数 > 1 时每次扫描都从下标 0 重新产生，S 参数块为到当前为止的平均值
+    LibreVNA 的 SCPI 只能读取整条迹线（不能只读新点），轮询间隔按 POLL_BACKOFF 退避
+    每次扫描结束打印 SCPI 消息数、命令数、往返次数和耗时
+    """
+    sock = session.sock
+    n_pts = args.sweep_points
+    n_avg = max(args.averages, 1)
+    s_acc = np.zeros((n_pts, 2, 2), dtype=np.complex128)
+    for i in range(n_avg):
+        if n_avg > 1:
+            print(f"Acquisition {i+1}/{n_avg}")
+        sock.reset()
+        start_measurement(sock)
+        t_start = time.perf_counter()
+        done = 0
+        while done < n_pts:
+            finished, freqs, data = poll_sweep(session)
+            n = min(len(freqs), n_pts)
+            if n > done:
+                s_acc[done:n] += data[done:n]
+                yield done, freqs[done:n], s_acc[done:n] / (i + 1)
+                done = n
+            elif finished:
+                raise RuntimeError(f"Sweep finished with {done}/{n_pts} points")
+            if done < n_pts and not finished:
+                time.sleep(max(POLL_INTERVAL, POLL_BACKOFF * (time.perf_counter() - t_start)))
+        print(f"Sweep {i+1}: {sock.summary()}")
+
+def sweep(session, args):
+    """完成一次（含平均）测量，返回 (频率 (点数,), S 参数 (点数, 2, 2) 复数数组)"""
+    freqs = sweep_freqs(args)
+    data = np.empty((args.sweep_points, 2, 2), dtype=np.complex128)
+    for lo, f, d in sweep_blocks(session, args):
+        freqs[lo:lo + len(f)] = f
+        data[lo:lo + len(f)] = d
+    return freqs, data
+
+def close_session(session):
+    session.sock.close()
+
+# ---------- 主函数 ----------
+def main():
+    args = parse_arguments()
+    session = open_session(args)
+    try:
+        freqs, data = sweep(session, args)
+        write_s2p(args.output_file, freqs, data)
         print("Done.")
     finally:
-        sock.close()
+        close_session(session)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -24,8 +24,17 @@ import sys
 import time
 import pyvisa
 import struct
+from types import SimpleNamespace
+import numpy as np
+sys.path.append('./')
+from xConv.xConvSNPWriter import write_snp, s2p_from_pairs
+from custom_tunnel.instru_stats import instru_stats
 
-def parse_arguments():
+# The instrument needs at least 101 points per sweep, segments are kept above that
+MIN_SEGMENT_POINTS = 201
+
+def parse_arguments(argv=None):
+    """Parse the command line, or argv when called in-process by meas_runner"""
     parser = argparse.ArgumentParser(description="Siglent VNA S2P Measurement Driver")
     parser.add_argument("--device-tunnel", default="VISA", help="Connection tunnel type")
     parser.add_argument("--device-address", required=True, help="VISA Resource Address (e.g., TCPIP0::192.168.1.100::INSTR)")
@@ -39,7 +48,14 @@ def parse_arguments():
     parser.add_argument("--source-level", type=float, default=-5.0, help="Source power level in dBm")
     parser.add_argument("--calibration", help="Filename of local calibration file to load (e.g., 'cal.cor')")
     parser.add_argument("--output-file", required=True, help="Output filename for .s2p data")
-    return parser.parse_args()
+    parser.add_argument("--data-format", default="AUTO", choices=["AUTO", "REAL64", "ASCII"],
+                        help="Trace transfer format: AUTO uses binary REAL,64 when supported, otherwise ASCII")
+    parser.add_argument("--batch-fetch", default="AUTO", choices=["AUTO", "ON", "OFF"],
+                        help="Fetch all traces in one ';'-joined message: AUTO probes support once when connecting")
+    parser.add_argument("--segment-points", type=int, default=0,
+                        help="Stream the sweep as separately triggered segments of about this many points "
+                             f"(at least {MIN_SEGMENT_POINTS}); 0 (default) runs the whole range as one sweep")
+    return parser.parse_args(argv)
 
 def configure_instrument(inst, args):
     # 1. Reset and Identification
@@ -124,111 +140,219 @@ def perform_measurement(inst):
     # [cite_start]Wait for operation complete [cite: 270]
     inst.query("*OPC?")
 
-def retrieve_data(inst):
+def negotiate_data_format(inst, requested="AUTO"):
+    """
+    Switch trace transfer to binary REAL,64 when the instrument supports it.
+    Returns the NumPy dtype of the binary data (byte order as reported by the instrument),
+    or None when traces are transferred as ASCII.
+    """
+    if requested != "ASCII":
+        try:
+            inst.write(":FORMat:DATA REAL,64")
+            inst.write(":FORMat:BORDer SWAPped")
+            if "REAL" in inst.query(":FORMat:DATA?").upper():
+                swapped = inst.query(":FORMat:BORDer?").strip().upper().startswith("SWAP")
+                print("Trace transfer: binary REAL,64")
+                return np.dtype('<f8' if swapped else '>f8')
+        except pyvisa.errors.VisaIOError:
+            pass
+        if requested == "REAL64":
+            raise RuntimeError("Instrument does not support REAL,64 trace transfer")
+    inst.write(":FORMat:DATA ASCii")
+    print("Trace transfer: ASCII")
+    return None
+
+# Map trace indices to S-parameters
+TRACE_MAP = {1: 's11', 2: 's21', 3: 's12', 4: 's22'}
+
+def read_block(inst, dtype):
+    """Read one IEEE 488.2 definite-length block and its separator (';' or newline)"""
+    head = inst.read_bytes(2)
+    if head[:1] != b'#':
+        raise ValueError(f"Expected a binary block, got {head!r}")
+    length = int(inst.read_bytes(int(head[1:2])))
+    data = np.frombuffer(inst.read_bytes(length), dtype=dtype)
+    inst.read_bytes(1)
+    return data
+
+def retrieve_data(inst, dtype=None, batch=False):
+    """
+    Read the 4 traces as flat [Re1, Im1, Re2, Im2, ...] float64 arrays.
+    dtype is the binary format from negotiate_data_format, None for ASCII.
+    batch=True selects and queries all traces in a single ';'-joined message (one round-trip).
+    """
     print("Retrieving trace data...")
-    s_params = {}
-    
-    # Map trace indices to S-parameters
-    trace_map = {1: 's11', 2: 's21', 3: 's12', 4: 's22'}
+    if batch:
+        msg = ";".join(f":CALCulate1:PARameter{idx}:SELect;:CALCulate1:SELected:DATA:FDATa?"
+                       for idx in TRACE_MAP)
+        if dtype is not None:
+            inst.write(msg)
+            values = [read_block(inst, dtype) for _ in TRACE_MAP]
+        else:
+            parts = inst.query(msg).split(';')
+            if len(parts) != len(TRACE_MAP):
+                raise ValueError(f"Expected {len(TRACE_MAP)} responses, got {len(parts)}")
+            values = [np.fromstring(p, dtype=np.float64, sep=',') for p in parts]
+        return dict(zip(TRACE_MAP.values(), values))
 
-    for trace_idx, s_name in trace_map.items():
+    s_params = {}
+    for trace_idx, s_name in TRACE_MAP.items():
         # [cite_start]Select the trace [cite: 494]
         inst.write(f":CALCulate1:PARameter{trace_idx}:SELect")
         
         # [cite_start]Query Formatted Data (Real, Imag pairs) [cite: 501]
-        # Using query_ascii_values to handle the comma-separated string automatically
-        data = inst.query_ascii_values(":CALCulate1:SELected:DATA:FDATa?")
+        if dtype is not None:
+            # IEEE 488.2 block, pyvisa decodes it with np.frombuffer (no per-value parsing)
+            data = inst.query_binary_values(":CALCulate1:SELected:DATA:FDATa?", datatype='d',
+                                            is_big_endian=dtype.byteorder == '>', container=np.array)
+        else:
+            # Vectorized ASCII parse of the comma-separated values
+            data = np.fromstring(inst.query(":CALCulate1:SELected:DATA:FDATa?"), dtype=np.float64, sep=',')
         s_params[s_name] = data
         
     return s_params
 
-def write_s2p(filename, freqs, s_data):
-    print(f"Exporting to {filename}...")
-    with open(filename, 'w') as f:
-        # Header
-        f.write("! Touchstone file generated by xDriver.py\n")
-        f.write("# Hz S RI R 50\n")
-        f.write("! Freq ReS11 ImS11 ReS21 ImS21 ReS12 ImS12 ReS22 ImS22\n")
+# Timeout (ms) of the batching probe, short so that unsupported firmware is detected quickly
+PROBE_TIMEOUT = 1000
 
-        num_points = len(freqs)
-        
-        # Iterate through points
-        # Note: s_data contains flat lists [Re1, Im1, Re2, Im2...]
-        for i in range(num_points):
-            idx = i * 2
-            line = f"{freqs[i]:.6e} "
-            
-            # S11 (Re, Im)
-            line += f"{s_data['s11'][idx]:.6f} {s_data['s11'][idx+1]:.6f} "
-            # S21 (Re, Im)
-            line += f"{s_data['s21'][idx]:.6f} {s_data['s21'][idx+1]:.6f} "
-            # S12 (Re, Im)
-            line += f"{s_data['s12'][idx]:.6f} {s_data['s12'][idx+1]:.6f} "
-            # S22 (Re, Im)
-            line += f"{s_data['s22'][idx]:.6f} {s_data['s22'][idx+1]:.6f}"
-            
-            f.write(line + "\n")
+def probe_batch(inst):
+    """Check once whether the instrument answers ';'-joined queries with one ';'-separated response"""
+    timeout = inst.timeout
+    inst.timeout = PROBE_TIMEOUT
+    try:
+        return len(inst.query("*IDN?;*IDN?").strip().split(';')) == 2
+    except pyvisa.errors.VisaIOError:
+        inst.clear()
+        return False
+    finally:
+        inst.timeout = timeout
 
-def main():
-    args = parse_arguments()
-    rm = pyvisa.ResourceManager()
+def fetch_traces(session):
+    """retrieve_data with the session's batch setting (resolved to ON/OFF in open_session)"""
+    return retrieve_data(session.inst, session.dtype, batch=session.batch == "ON")
 
+def sweep_freqs(args):
+    """Frequency points (Hz) of the configured sweep"""
+    if args.sweep_points <= 1:
+        return np.array([args.start_freq])
+    if args.sweep_type == "LIN":
+        return np.linspace(args.start_freq, args.stop_freq, args.sweep_points)
+    return np.logspace(np.log10(args.start_freq), np.log10(args.stop_freq), args.sweep_points)
+
+def write_s2p(filename, freqs, data):
+    print(f"Exporting to {filename}...")
+    # data is a (points, 2, 2) complex array, formatted in bulk by the shared writer
+    write_snp(filename, freqs, data,
+              comments=["Touchstone file generated by xDriver.py"],
+              with_column_comment=True)
+
+# ---------- Session interface (shared by the CLI and meas_runner) ----------
+def open_session(args):
+    """
+    Connect to and configure the instrument.
+    The session holds the resource manager, the instrument (wrapped to count SCPI traffic),
+    the trace transfer dtype and the batch-fetch setting.
+    """
+    rm = pyvisa.ResourceManager()
     try:
         inst = rm.open_resource(args.device_address)
         # Increase timeout for slow sweeps/averaging
-        inst.timeout = 20000 
-        
+        inst.timeout = 20000
+
         configure_instrument(inst, args)
+        dtype = negotiate_data_format(inst, args.data_format)
+        batch = args.batch_fetch
+        if batch == "AUTO":
+            batch = "ON" if probe_batch(inst) else "OFF"
+            print(f"Batched trace fetch: {batch}")
         time.sleep(10)  # Allow settings to take effect
-        
-        if args.averages > 1:
-            s_data_bf = {}
-            for i in range(args.averages):
-                print(f"Acquisition {i+1} of {args.averages}...")
+    except Exception:
+        rm.close()
+        raise
+    return SimpleNamespace(rm=rm, inst=instru_stats(inst), dtype=dtype, batch=batch)
+
+def segment_bounds(n_points, segment_points=0):
+    """
+    Index bounds of the sweep segments, each segment has at least segment_points points.
+    segment_points = 0 gives a single segment covering the whole sweep.
+    """
+    if segment_points <= 0:
+        return np.array([0, n_points])
+    n_seg = max(1, n_points // max(segment_points, MIN_SEGMENT_POINTS))
+    return np.linspace(0, n_points, n_seg + 1).astype(int)
+
+def set_sweep_range(inst, start, stop, points, batch=False):
+    cmds = [f":SENSe1:FREQuency:STARt {start}", f":SENSe1:FREQuency:STOP {stop}",
+            f":SENSe1:SWEep:POINts {points}"]
+    if batch:
+        inst.write(";".join(cmds))
+    else:
+        for cmd in cmds:
+            inst.write(cmd)
+
+def sweep_blocks(session, args):
+    """
+    Measurement as (start index, freqs block, S-parameter block) blocks.
+    By default the whole range is one sweep and one block. With --segment-points the sweep
+    is split into separately triggered segments over the same frequency grid (same
+    start/stop/spacing per segment), each yielded as soon as it has been read back;
+    note that each segment is a sweep of its own (settling, averaging, extra round-trips).
+    With averages > 1 every pass restarts at index 0 and yields the running average.
+    SCPI command counts and latency are printed after every pass.
+    """
+    inst = session.inst
+    freqs = sweep_freqs(args)
+    bounds = segment_bounds(len(freqs), args.segment_points)
+    segmented = len(bounds) > 2
+    n_avg = max(args.averages, 1)
+    s_acc = np.zeros((len(freqs), 2, 2), dtype=np.complex128)
+    try:
+        for i in range(n_avg):
+            if n_avg > 1:
+                print(f"Acquisition {i+1} of {n_avg}...")
+            inst.reset()
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                if segmented:
+                    set_sweep_range(inst, freqs[lo], freqs[hi - 1], hi - lo, session.batch != "OFF")
                 perform_measurement(inst)
-                s_data = retrieve_data(inst)
-                # 累加s_data到s_data_bf
-                for k in s_data:
-                    if k not in s_data_bf:
-                        s_data_bf[k] = s_data[k]
-                    else:
-                        s_data_bf[k] = [s_data_bf[k][j] + s_data[k][j] for j in range(len(s_data[k]))]
-            s_data = {k: [v / args.averages for v in s_data_bf[k]] for k in s_data_bf}
-        else:
-            perform_measurement(inst)
-            s_data = retrieve_data(inst)
-
-        # Generate Frequency List (Linear)
-        freqs = []
-        if args.sweep_type == "LIN":
-            if args.sweep_points > 1:
-                step = (args.stop_freq - args.start_freq) / (args.sweep_points - 1)
-                freqs = [args.start_freq + i * step for i in range(args.sweep_points)]
-            else:
-                freqs = [args.start_freq]
-        else:
-            # Generate Logarithmic frequency list
-            if args.sweep_points > 1:
-                import numpy as np
-                freqs = np.logspace(np.log10(args.start_freq), np.log10(args.stop_freq), args.sweep_points).tolist()
-            else:
-                freqs = [args.start_freq]
-
-        write_s2p(args.output_file, freqs, s_data)
-        
+                s_acc[lo:hi] += s2p_from_pairs(fetch_traces(session))
+                yield lo, freqs[lo:hi], s_acc[lo:hi] / (i + 1)
+            print(f"Sweep {i+1}: {inst.summary()}")
+    finally:
+        if segmented:
+            # Leave the full sweep configured on the instrument
+            set_sweep_range(inst, args.start_freq, args.stop_freq, args.sweep_points, session.batch != "OFF")
+
+def sweep(session, args):
+    """Run one (averaged) measurement, return (freqs (points,), S-parameters (points, 2, 2) complex)"""
+    freqs = sweep_freqs(args)
+    data = np.empty((len(freqs), 2, 2), dtype=np.complex128)
+    for lo, f, d in sweep_blocks(session, args):
+        data[lo:lo + len(f)] = d
+    return freqs, data
+
+def close_session(session):
+    try:
         # Restore Continuous Sweep
-        inst.write(":INITiate1:CONTinuous ON")
-        
+        session.inst.write(":INITiate1:CONTinuous ON")
+    finally:
+        session.inst.close()
+        session.rm.close()
+
+def main():
+    args = parse_arguments()
+    try:
+        session = open_session(args)
+        try:
+            freqs, data = sweep(session, args)
+            write_s2p(args.output_file, freqs, data)
+        finally:
+            close_session(session)
         print("Done.")
 
     except Exception as e:
         print(f"Error: {e}")
         sys.exit(1)
-    finally:
-        if 'inst' in locals():
-            inst.close()
-        if 'rm' in locals():
-            rm.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()